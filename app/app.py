@@ -1,5 +1,7 @@
-from fastapi import FastAPI, HTTPException
-from db.db import init_db
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from db.db import init_db, count_queries
 from db.models import *
 from routers.user_router import user_router
 from routers.hackathon_router import hackathon_router
@@ -7,9 +9,23 @@ from routers.team_router import team_router
 from routers.task_router import task_router
 from routers.solution_router import solution_router, fix_router
 from routers.auth_router import auth_router
-import requests
+from cache.entity_cache import entity_cache
+from clients.parser_client import create_parser_client, create_parser_stream_client
+from auth.password_hasher import password_hasher
+import httpx
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    app.state.parser_client = create_parser_client()
+    app.state.parser_stream_client = create_parser_stream_client()
+    password_hasher.start()
+    yield
+    await app.state.parser_client.aclose()
+    await app.state.parser_stream_client.aclose()
+    password_hasher.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(hackathon_router)
@@ -18,56 +34,100 @@ app.include_router(task_router)
 solution_router.include_router(fix_router)
 app.include_router(solution_router)
 
-@app.on_event('startup')
-def on_startup():
-    init_db()
+@app.middleware("http")
+async def add_query_count_header(request: Request, call_next):
+    with count_queries() as counter:
+        response = await call_next(request)
+    response.headers["X-Query-Count"] = str(counter.count)
+    return response
 
 @app.get("/")
 def test():
     return {"test": "test"}
 
-@app.post("/parse")
-def parse(size: int=10, slice: int=1):
-    session = requests.Session()
+@app.get("/cache/stats")
+def get_cache_stats():
+    return entity_cache.get_stats()
+
+async def proxy_to_parser(request: Request, method: str, url: str, **kwargs):
+    client = request.app.state.parser_client
     try:
-        r = session.post("http://parser-app:9000/parse",
-                    params={"size": size, "slice": slice})
-    except requests.exceptions.ConnectionError:
+        return await client.request(method, url, **kwargs)
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=504,
+            detail="Parser timeout"
+        )
+    except httpx.TransportError:
         raise HTTPException(
             status_code=502,
             detail="Connection error"
         )
-    if r.ok:
+
+@app.post("/parse")
+async def parse(request: Request, size: int=10, slice: int=1):
+    r = await proxy_to_parser(request, "POST", "/parse",
+                              params={"size": size, "slice": slice})
+    if r.is_success:
         return r.json()
     else:
         return {"ok": False}
 
 @app.post("/parse_url")
-def parse_url(url: str):
-    session = requests.Session()
-    try:
-        r = session.post("http://parser-app:9000/parse_url",
-                         params={"url": url})
-    except requests.exceptions.ConnectionError:
-        raise HTTPException(
-            status_code=502,
-            detail="Connection error"
-        )
-    
-    if r.ok:
+async def parse_url(request: Request, url: str):
+    r = await proxy_to_parser(request, "POST", "/parse_url",
+                              params={"url": url})
+    if r.is_success:
         return r.json()
     else:
         return {"ok": False}
-    
+
 @app.get("/parse-task/{task_id}")
-def get_task_status(task_id: str):
-    session = requests.Session()
+async def get_task_status(request: Request, task_id: str):
+    r = await proxy_to_parser(request, "GET", f"/task/{task_id}")
+    return r.json()
+
+# поток событий о задачах парсера (SSE) вместо опроса /parse-task/{task_id}:
+# одно долгое соединение на клиента через отдельный клиент для потоков
+@app.get("/parse-events")
+async def stream_task_events(request: Request, ids: List[str] = Query()):
+    client = request.app.state.parser_stream_client
+    upstream = client.build_request("GET", "/events", params={"ids": ids})
     try:
-        r = session.get(f"http://parser-app:9000/task/{task_id}")
-    except requests.exceptions.ConnectionError:
+        r = await client.send(upstream, stream=True)
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=504,
+            detail="Parser timeout"
+        )
+    except httpx.TransportError:
         raise HTTPException(
             status_code=502,
             detail="Connection error"
         )
-    
-    return r.json()
\ No newline at end of file
+    # неизвестные id парсер отклоняет до начала потока
+    if not r.is_success:
+        await r.aread()
+        await r.aclose()
+        # ответ может быть не от FastAPI парсера (500 текстом, страница прокси)
+        try:
+            detail = r.json().get("detail")
+        except (ValueError, AttributeError):
+            detail = r.text
+        raise HTTPException(
+            status_code=r.status_code,
+            detail=detail
+        )
+
+    async def relay():
+        try:
+            async for chunk in r.aiter_raw():
+                yield chunk
+        finally:
+            await r.aclose()
+
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
@@ -1,14 +1,34 @@
 import datetime
-from fastapi import Security, HTTPException
+import hashlib
+import time
+from collections import OrderedDict
+from fastapi import Depends, Security, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from starlette import status
+from dotenv import load_dotenv
+from dto.GeneralDto import Principal
 import jwt
 import os
 
+load_dotenv('app/.env')
+
+# стоимость bcrypt хранится в самом хэше ($2b$<rounds>$...), поэтому при смене
+# BCRYPT_ROUNDS старые хэши прозрачно пересчитываются при следующем входе
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"])
-secret = os.urandom(16)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+# ключ подписи общий для всех воркеров и инстансов; случайный ключ
+# подходит только для запуска в одном процессе
+JWT_SECRET = os.getenv("JWT_SECRET")
+secret = JWT_SECRET.encode() if JWT_SECRET else os.urandom(16)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 4096))
 
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -16,6 +36,9 @@ def get_password_hash(password):
 def verify_password(password, hashed_password):
     return pwd_context.verify(password, hashed_password)
 
+def verify_and_update_password(password, hashed_password):
+    return pwd_context.verify_and_update(password, hashed_password)
+
 def encode_token(user_id, role):
     payload = {
         "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=30),
@@ -24,10 +47,39 @@ def encode_token(user_id, role):
     }
     return jwt.encode(payload=payload, key=secret, algorithm="HS256")
 
+# проверенные claims кэшируются по sha256 токена до истечения его exp,
+# чтобы повторные запросы с тем же токеном не проверяли подпись заново
+class TokenCache:
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+
+    def get(self, digest):
+        entry = self._data.get(digest)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del self._data[digest]
+            return None
+        self._data.move_to_end(digest)
+        return payload
+
+    def set(self, digest, payload):
+        self._data[digest] = (payload.get("exp", 0), payload)
+        self._data.move_to_end(digest)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+token_cache = TokenCache()
+
 def decode_token(token):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(jwt=token, key=secret, algorithms="HS256")
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
@@ -39,8 +91,10 @@ def decode_token(token):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid Token"
             )
+    token_cache.set(digest, payload)
+    return payload
 
-def get_current_user(auth: HTTPAuthorizationCredentials = Security(security)):
+async def get_current_user(auth: HTTPAuthorizationCredentials = Security(security)):
     credentials_error = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials"
@@ -52,16 +106,13 @@ def get_current_user(auth: HTTPAuthorizationCredentials = Security(security)):
     
     return payload
 
-def get_current_user_id(auth: HTTPAuthorizationCredentials = Security(security)):
-    payload = get_current_user(auth)
-    try:
-        return payload["user_id"]
-    except KeyError:
-        return None
+# зависимость кэшируется FastAPI в рамках запроса, поэтому токен
+# разбирается один раз, сколько бы зависимостей ниже его ни использовали
+async def get_current_principal(payload: dict = Depends(get_current_user)) -> Principal:
+    return Principal(user_id=payload.get("user_id"), role=payload.get("role"))
 
-def get_current_user_role(auth: HTTPAuthorizationCredentials = Security(security)):
-    payload = get_current_user(auth)
-    try:
-        return payload["role"]
-    except KeyError:
-        return None
+async def get_current_user_id(principal: Principal = Depends(get_current_principal)):
+    return principal.user_id
+
+async def get_current_user_role(principal: Principal = Depends(get_current_principal)):
+    return principal.role
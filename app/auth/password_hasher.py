@@ -0,0 +1,62 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from starlette import status
+from auth.auth_handler import get_password_hash, verify_and_update_password
+
+# os.cpu_count() - все ядра хоста, даже если процессу доступна их часть
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 2
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", _available_cpus()))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", 32))
+
+# bcrypt считается в отдельном пуле процессов, чтобы хэширование шло
+# параллельно на всех ядрах и не занимало потоки, нужные остальным запросам.
+# очередь ограничена: при переполнении сразу отвечаем 503, а не копим запросы
+
+class PasswordHasher:
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._pending = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, try again later",
+                headers={"Retry-After": "1"}
+            )
+        self.start()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password):
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, password, hashed_password):
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+try:
+    from redis import RedisError
+    from redis import asyncio as redis_asyncio
+except ImportError:
+    RedisError = None
+    redis_asyncio = None
+
+load_dotenv('app/.env')
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", 10000))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+logger = logging.getLogger(__name__)
+
+# кэш ответов GET /{id} в два уровня: LRU с TTL в памяти процесса и
+# (если задан CACHE_REDIS_URL) общий Redis. Каждая запись привязана к версии
+# сущности и версии ее вида; обновление/удаление увеличивает версию, поэтому
+# все воркеры сразу перестают отдавать старые данные. Версии вида нужны для
+# вложенных сущностей: например, ответ команды содержит хакатон.
+# Redis необязателен: при его ошибках чтение идет мимо кэша в базу,
+# а неудачная инвалидация логируется и считается в stats
+
+class LRUCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+class EntityCache:
+    def __init__(self, max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL, redis_url=CACHE_REDIS_URL):
+        self.ttl = ttl
+        self.local = LRUCache(max_size, ttl)
+        self.redis = redis_asyncio.from_url(redis_url) if redis_url and redis_asyncio else None
+        self._versions = {}
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+            "redis_errors": 0,
+        }
+
+    def _redis_failed(self, action):
+        self.stats["redis_errors"] += 1
+        logger.exception("Entity cache: redis %s failed", action)
+
+    # None - версию узнать не удалось, кэшем пользоваться нельзя
+    async def _version(self, kind, id):
+        keys = [f"cache:ver:{kind}", f"cache:ver:{kind}:{id}"]
+        if self.redis:
+            try:
+                values = await self.redis.mget(keys)
+            except RedisError:
+                self._redis_failed("mget")
+                return None
+        else:
+            values = [self._versions.get(key) for key in keys]
+        return ".".join(str(int(value or 0)) for value in values)
+
+    async def get_or_load(self, kind, id, loader):
+        key = f"cache:{kind}:{id}"
+        version = await self._version(kind, id)
+        if version is None:
+            self.stats["misses"] += 1
+            return await loader()
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == version:
+            self.stats["local_hits"] += 1
+            return entry[1]
+
+        if self.redis:
+            try:
+                raw = await self.redis.get(f"{key}:{version}")
+            except RedisError:
+                self._redis_failed("get")
+                raw = None
+            if raw is not None:
+                self.stats["redis_hits"] += 1
+                value = json.loads(raw)
+                self.local.set(key, (version, value))
+                return value
+
+        self.stats["misses"] += 1
+        value = await loader()
+        if value is None:
+            return None
+        self.local.set(key, (version, value))
+        if self.redis:
+            try:
+                await self.redis.set(f"{key}:{version}", json.dumps(value), ex=self.ttl)
+            except RedisError:
+                self._redis_failed("set")
+        return value
+
+    async def invalidate(self, kind, id=None):
+        self.stats["invalidations"] += 1
+        if id is None:
+            version_key = f"cache:ver:{kind}"
+        else:
+            version_key = f"cache:ver:{kind}:{id}"
+            self.local.pop(f"cache:{kind}:{id}")
+        if self.redis:
+            try:
+                await self.redis.incr(version_key)
+            except RedisError:
+                self._redis_failed("incr")
+        else:
+            self._versions[version_key] = self._versions.get(version_key, 0) + 1
+
+    def get_stats(self):
+        return {**self.stats, "local_size": len(self.local), "redis": self.redis is not None}
+
+entity_cache = EntityCache()
+
+async def get_cached(kind, id, response_model, load):
+    async def loader():
+        record = await load()
+        if not record:
+            return None
+        return response_model.model_validate(record).model_dump(mode="json")
+
+    return await entity_cache.get_or_load(kind, id, loader)
@@ -0,0 +1,50 @@
+import httpx
+import os
+from dotenv import load_dotenv
+
+load_dotenv('app/.env')
+
+PARSER_URL = os.getenv("PARSER_URL", "http://parser-app:9000")
+PARSER_CONNECT_TIMEOUT = float(os.getenv("PARSER_CONNECT_TIMEOUT", 3))
+PARSER_READ_TIMEOUT = float(os.getenv("PARSER_READ_TIMEOUT", 60))
+PARSER_POOL_TIMEOUT = float(os.getenv("PARSER_POOL_TIMEOUT", 10))
+PARSER_MAX_CONNECTIONS = int(os.getenv("PARSER_MAX_CONNECTIONS", 50))
+PARSER_MAX_KEEPALIVE = int(os.getenv("PARSER_MAX_KEEPALIVE", 20))
+PARSER_MAX_STREAMS = int(os.getenv("PARSER_MAX_STREAMS", 200))
+
+# один клиент на все время жизни приложения: соединения к parser-app
+# переиспользуются (keep-alive), а max_connections ограничивает число
+# одновременных запросов к парсеру
+
+def create_parser_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=PARSER_URL,
+        timeout=httpx.Timeout(
+            PARSER_READ_TIMEOUT,
+            connect=PARSER_CONNECT_TIMEOUT,
+            pool=PARSER_POOL_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=PARSER_MAX_CONNECTIONS,
+            max_keepalive_connections=PARSER_MAX_KEEPALIVE
+        )
+    )
+
+# потоки SSE держат соединение, пока открыта страница клиента, поэтому
+# у них свой клиент и свой лимит: иначе открытые дашборды заняли бы весь
+# пул обычных запросов к парсеру. Таймаута чтения нет, между событиями
+# парсер шлет keep-alive
+
+def create_parser_stream_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=PARSER_URL,
+        timeout=httpx.Timeout(
+            None,
+            connect=PARSER_CONNECT_TIMEOUT,
+            pool=PARSER_POOL_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=PARSER_MAX_STREAMS,
+            max_keepalive_connections=PARSER_MAX_KEEPALIVE
+        )
+    )
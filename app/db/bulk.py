@@ -0,0 +1,39 @@
+from fastapi import HTTPException
+from sqlmodel import select
+from starlette import status
+from dto.GeneralDto import BulkItemResult, BulkCreateResponse
+
+MAX_BULK_SIZE = 5000
+
+# пакетное создание: внешние ключи проверяются одним запросом на таблицу,
+# все валидные записи вставляются одной транзакцией (многострочный INSERT)
+
+def check_bulk_size(models):
+    if len(models) > MAX_BULK_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many items, max batch size is {MAX_BULK_SIZE}"
+        )
+
+async def existing_ids(session, id_column, ids):
+    ids = {id for id in ids if id is not None}
+    if not ids:
+        return set()
+    return set((await session.exec(select(id_column).where(id_column.in_(ids)))).all())
+
+async def bulk_insert(session, table_model, models, validate, before_commit=None) -> BulkCreateResponse:
+    results = [None] * len(models)
+    records = []
+    for index, model in enumerate(models):
+        error = validate(model)
+        if error:
+            results[index] = BulkItemResult(index=index, status="error", detail=error)
+            continue
+        records.append((index, table_model.model_validate(model)))
+    session.add_all([record for _, record in records])
+    if before_commit is not None:
+        await before_commit()
+    await session.commit()
+    for index, record in records:
+        results[index] = BulkItemResult(index=index, status="created", id=getattr(record, "id", None))
+    return BulkCreateResponse(created=len(records), results=results)
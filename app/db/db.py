@@ -1,15 +1,59 @@
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
 import os
 
 load_dotenv('app/.env')
 
 db_url = os.getenv("POSTGRES_URL")
+async_db_url = os.getenv("ASYNC_POSTGRES_URL")
+pool_size = int(os.getenv("DB_POOL_SIZE", 20))
+max_overflow = int(os.getenv("DB_MAX_OVERFLOW", 20))
+
 engine = create_engine(db_url, echo=False)
+async_engine = create_async_engine(
+    async_db_url,
+    echo=False,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_pre_ping=True
+)
+
+# счетчик SQL-запросов в рамках одного запроса к API,
+# отдается в заголовке X-Query-Count и используется в тестах
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+query_counter: ContextVar[QueryCounter | None] = ContextVar("query_counter", default=None)
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = query_counter.get()
+    if counter is not None:
+        counter.count += 1
 
-def init_db():
-    SQLModel.metadata.create_all(engine)
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    token = query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        query_counter.reset(token)
+
+async def init_db():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,23 @@
+import hashlib
+from fastapi import Request, Response
+from starlette import status
+
+# ETag строится из версий строк, которые попадают в ответ, поэтому
+# проверить If-None-Match можно легким запросом версий, не загружая связи.
+# Версия увеличивается в самом UPDATE (version = version + 1), а не
+# в python: иначе два параллельных PATCH записали бы одну и ту же версию
+# с разным содержимым
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,62 @@
+import csv
+import io
+from enum import Enum
+from typing import Literal
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db.db import async_engine
+
+EXPORT_CHUNK_SIZE = 1000
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# выгрузка читает строки через серверный курсор пачками по EXPORT_CHUNK_SIZE
+# и сразу отдает их клиенту, поэтому память не зависит от размера выгрузки.
+# сессия открывается внутри генератора: сессия из зависимости закрывается
+# до того, как StreamingResponse начнет отдавать тело
+
+def _csv_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def _csv_chunk(rows, columns, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_csv_value(getattr(row, column)) for column in columns])
+    return buffer.getvalue()
+
+def _ndjson_chunk(rows, response_model):
+    return "".join(
+        response_model.model_validate(row).model_dump_json() + "\n"
+        for row in rows
+    )
+
+async def _stream_rows(query, fmt, response_model, columns):
+    async with AsyncSession(async_engine) as session:
+        result = await session.stream_scalars(
+            query.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        if fmt == "csv":
+            yield _csv_chunk([], columns, header=True)
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _csv_chunk(rows, columns)
+            else:
+                yield _ndjson_chunk(rows, response_model)
+
+def export_response(query, fmt: ExportFormat, response_model, table_model, filename: str) -> StreamingResponse:
+    columns = list(table_model.__table__.columns.keys())
+    return StreamingResponse(
+        _stream_rows(query, fmt, response_model, columns),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
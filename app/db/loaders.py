@@ -0,0 +1,28 @@
+from sqlalchemy.orm import joinedload, selectinload
+from db.models import Hackathon, Team, Task, TeamTaskSolution, SolutionFix
+
+# стратегии загрузки связей под каждую response-модель, чтобы список
+# отдавался за постоянное число запросов: many-to-one подтягиваем
+# через joinedload (одним JOIN-ом), коллекции через selectinload
+
+HACKATHON_RESPONSE_OPTIONS = [
+    joinedload(Hackathon.organizer),
+]
+
+TEAM_RESPONSE_OPTIONS = [
+    joinedload(Team.hackathon),
+    selectinload(Team.users),
+]
+
+TASK_RESPONSE_OPTIONS = [
+    joinedload(Task.hackathon),
+]
+
+SOLUTION_RESPONSE_OPTIONS = [
+    joinedload(TeamTaskSolution.team),
+    joinedload(TeamTaskSolution.task),
+]
+
+FIX_RESPONSE_OPTIONS = [
+    joinedload(SolutionFix.solution),
+]
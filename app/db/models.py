@@ -60,61 +60,79 @@ class Teammate(SQLModel, table=True):
 
 class User(UserDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     hackathons_organized: List["Hackathon"] | None = Relationship(back_populates="organizer", cascade_delete=True)
     teams: List["Team"] | None = Relationship(back_populates="users", link_model=Teammate)
 
 class Hackathon(HackathonDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    # данные краулера для инкрементального обновления
+    source_url: str | None = Field(default=None, unique=True)
+    content_hash: str | None = None
+    http_etag: str | None = None
+    http_last_modified: str | None = None
+    feed_hash: str | None = None
     organizer: "User" = Relationship(back_populates="hackathons_organized")
     teams: List["Team"] | None = Relationship(back_populates="hackathon", cascade_delete=True)
     tasks: List["Task"] | None = Relationship(back_populates="hackathon", cascade_delete=True)
 
 class Team(TeamDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     hackathon: "Hackathon" = Relationship(back_populates="teams")
     users: List["User"] | None = Relationship(back_populates="teams", link_model=Teammate)
     solutions: List["TeamTaskSolution"] | None = Relationship(back_populates="team", cascade_delete=True)
 
 class Task(TaskDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     hackathon: "Hackathon" = Relationship(back_populates="tasks")
     solutions: List["TeamTaskSolution"] | None = Relationship(back_populates="task", cascade_delete=True)
 
 class TeamTaskSolution(TeamTaskSolutionDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     team: "Team" = Relationship(back_populates="solutions")
     task: "Task" = Relationship(back_populates="solutions")
     fixes: List["SolutionFix"] = Relationship(back_populates="solution", cascade_delete=True)
 
 class SolutionFix(SolutionFixDefault, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
     solution: "TeamTaskSolution" = Relationship(back_populates="fixes")
 
 # response models
 
 class UserResponse(UserDefault):
     id: int | None = None
+    version: int | None = None
 
 class HackathonResponse(HackathonDefault):
     id: int | None = None
+    version: int | None = None
     organizer: Optional["User"] = None
 
 class TeamResponse(TeamDefault):
     id: int | None = None
+    version: int | None = None
     hackathon: Optional["Hackathon"] = None
     users: Optional[List["User"]] = None
 
 class TaskResponse(TaskDefault):
     id: int | None = None
+    version: int | None = None
     hackathon: Optional["Hackathon"] = None
 
 class TeamTaskSolutionResponse(TeamTaskSolutionDefault):
     id: int | None = None
+    version: int | None = None
     team: Optional["Team"] = None
     task: Optional["Task"] = None
 
 class SolutionFixResponse(SolutionFixDefault):
     id: int | None = None
+    version: int | None = None
     solution: Optional["TeamTaskSolution"] = None
 
 class UserLogin(SQLModel):
@@ -0,0 +1,48 @@
+import base64
+import binascii
+from fastapi import HTTPException, Query, Response
+from starlette import status
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# keyset-пагинация по id: клиент получает непрозрачный курсор в заголовке
+# X-Next-Cursor и передает его в параметр after за следующей страницей
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        prefix, last_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if prefix != "id":
+            raise ValueError
+        return int(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+        after: str | None = None
+    ):
+        self.limit = limit
+        self.after = decode_cursor(after) if after else None
+
+# лишняя строка сверх limit показывает, есть ли следующая страница
+def keyset_page(query, id_column, page: PageParams):
+    if page.after is not None:
+        query = query.where(id_column > page.after)
+    return query.order_by(id_column).limit(page.limit + 1)
+
+async def fetch_page(session, query, id_column, page: PageParams, response: Response):
+    rows = (await session.exec(keyset_page(query, id_column, page))).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
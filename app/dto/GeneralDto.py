@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 class TokenResponse(BaseModel):
@@ -9,3 +10,17 @@ class UserPasswordChange(BaseModel):
 
 class PasswordChangeResponse(BaseModel):
     success: bool
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str
+    id: int | None = None
+    detail: str | None = None
+
+class BulkCreateResponse(BaseModel):
+    created: int
+    results: List[BulkItemResult]
+
+class Principal(BaseModel):
+    user_id: int | None = None
+    role: str | None = None
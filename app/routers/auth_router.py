@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from db.models import User, UserDefault, UserResponse, UserLogin
-from db.db import get_session
+from db.db import get_async_session
 from sqlmodel import select, or_
-from auth.auth_handler import get_password_hash, verify_password, encode_token
+from auth.auth_handler import encode_token
+from auth.password_hasher import password_hasher
+from cache.entity_cache import entity_cache
 from dto.GeneralDto import TokenResponse
 
 auth_router = APIRouter(prefix="/auth", tags=["/auth"])
@@ -11,46 +13,55 @@ auth_router = APIRouter(prefix="/auth", tags=["/auth"])
     "/register",
     response_model=UserResponse
 )
-def register(model: UserDefault, session=Depends(get_session)) -> UserResponse:
+async def register(model: UserDefault, session=Depends(get_async_session)) -> UserResponse:
     model = User.model_validate(model)
-    if session.exec(select(User)
+    if (await session.exec(select(User)
                     .where(
                         or_(User.username == model.username,
                             User.email == model.email)
-                        )).first():
+                        ))).first():
         raise HTTPException(
             status_code=400,
             detail="User with this username or email already exists"
         )
-    hashed_password = get_password_hash(model.password)
+    hashed_password = await password_hasher.hash(model.password)
     model.password = hashed_password
 
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
 
-    result = session.exec(select(User).where(User.username == model.username)).first()
+    result = (await session.exec(select(User).where(User.username == model.username))).first()
     return result
 
 @auth_router.post(
     "/login",
     response_model=TokenResponse
 )
-def login(model: UserLogin, session=Depends(get_session)) -> TokenResponse:
+async def login(model: UserLogin, session=Depends(get_async_session)) -> TokenResponse:
     model = UserLogin.model_validate(model)
-    user = session.exec(
+    user = (await session.exec(
         select(User)
         .where(User.username == model.username)
-    ).first()
+    )).first()
     if not user:
         raise HTTPException(
             status_code=400,
             detail="Invalid username and/or password"
         )
-    if not verify_password(model.password, user.password):
+    valid, new_hash = await password_hasher.verify_and_update(model.password, user.password)
+    if not valid:
         raise HTTPException(
             status_code=400,
             detail="Invalid username and/or password"
         )
+    if new_hash:
+        user.password = new_hash
+        user.version = User.version + 1
+        session.add(user)
+        await session.commit()
+        await entity_cache.invalidate("user", user.id)
+        await entity_cache.invalidate("hackathon")
+        await entity_cache.invalidate("team")
     jwt_token = encode_token(user.id, user.role)
     return TokenResponse(token=jwt_token)
\ No newline at end of file
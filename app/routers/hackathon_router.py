@@ -1,46 +1,108 @@
-from fastapi import Depends, APIRouter, HTTPException
+from fastapi import Depends, APIRouter, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
-from db.db import get_session
+from db.db import get_async_session
 from db.models import *
+from db.loaders import *
+from db.pagination import PageParams, fetch_page, keyset_page
+from db.export import ExportFormat, export_response
+from db.etag import make_etag, is_not_modified, not_modified_response
+from cache.entity_cache import entity_cache, get_cached
 from sqlmodel import select
 from starlette import status
 
 hackathon_router = APIRouter(prefix="/hackathon", tags=["hackathons"])
 
 @hackathon_router.get("/list", response_model=List[HackathonResponse])
-def get_hackathon_list(session=Depends(get_session)) -> List[Hackathon]:
-    return session.exec(select(Hackathon)).all()
+async def get_hackathon_list(
+    response: Response,
+    location: str | None = None,
+    organizer_id: int | None = None,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[Hackathon]:
+    query = select(Hackathon).options(*HACKATHON_RESPONSE_OPTIONS)
+    if location is not None:
+        query = query.where(Hackathon.location == location)
+    if organizer_id is not None:
+        query = query.where(Hackathon.organizer_id == organizer_id)
+    return await fetch_page(session, query, Hackathon.id, page, response)
+
+@hackathon_router.get("/list/export")
+async def export_hackathon_list(
+    format: ExportFormat = "ndjson",
+    location: str | None = None,
+    organizer_id: int | None = None
+):
+    query = select(Hackathon).options(*HACKATHON_RESPONSE_OPTIONS).order_by(Hackathon.id)
+    if location is not None:
+        query = query.where(Hackathon.location == location)
+    if organizer_id is not None:
+        query = query.where(Hackathon.organizer_id == organizer_id)
+    return export_response(query, format, HackathonResponse, Hackathon, "hackathons")
 
 @hackathon_router.get("/{id}", response_model=HackathonResponse)
-def get_hackathon_by_id(id: int, session=Depends(get_session)) -> Hackathon:
-    db_record = session.get(Hackathon, id)
+async def get_hackathon_by_id(
+    id: int,
+    request: Request,
+    response: Response,
+    session=Depends(get_async_session)
+) -> dict:
+    def load():
+        return session.get(Hackathon, id, options=HACKATHON_RESPONSE_OPTIONS)
+
+    # версии читаются из базы только для условного запроса, обычное
+    # попадание в кэш обходится без запроса к Postgres
+    versions = None
+    if request.headers.get("if-none-match"):
+        query = select(Hackathon.version, User.version) \
+                .outerjoin(User, Hackathon.organizer_id == User.id) \
+                .where(Hackathon.id == id)
+        versions = (await session.exec(query)).first()
+        if versions:
+            etag = make_etag(id, *versions)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+    db_record = await get_cached("hackathon", id, HackathonResponse, load)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
+    organizer = db_record["organizer"] or {}
+    # строку мог обновить краулер parser-app в обход инвалидации кэша:
+    # если версии в базе другие, запись в кэше перечитывается
+    if versions and tuple(versions) != (db_record["version"], organizer.get("version")):
+        await entity_cache.invalidate("hackathon", id)
+        db_record = await get_cached("hackathon", id, HackathonResponse, load)
+        if not db_record:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Hackathon was not found"
+            )
+        organizer = db_record["organizer"] or {}
+    response.headers["ETag"] = make_etag(id, db_record["version"], organizer.get("version"))
     return db_record
 
 @hackathon_router.post("/create")
-def create_hackathon(model: HackathonDefault, session=Depends(get_session)) -> JSONResponse:
+async def create_hackathon(model: HackathonDefault, session=Depends(get_async_session)) -> JSONResponse:
     model = Hackathon.model_validate(model)
-    user = session.get(User, model.organizer_id)
+    user = await session.get(User, model.organizer_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
     return JSONResponse(
         content={"message": "Hackathon was successfully created"},
         status_code=status.HTTP_201_CREATED
     )
 
 @hackathon_router.patch("/update")
-def update_hackathon(id: int, model: HackathonDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Hackathon, id)
+async def update_hackathon(id: int, model: HackathonDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Hackathon, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -49,40 +111,93 @@ def update_hackathon(id: int, model: HackathonDefault, session=Depends(get_sessi
     data = Hackathon.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = Hackathon.version + 1
     session.add(db_record)
-    session.commit()
-    session.refresh(db_record)
+    await session.commit()
+    await session.refresh(db_record)
+    await entity_cache.invalidate("hackathon", id)
+    await entity_cache.invalidate("team")
+    await entity_cache.invalidate("task")
     return JSONResponse(
         content={"message": "Hackathon was successfully created"}
     )
 
 @hackathon_router.delete("/{id}")
-def delete_hackathon(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Hackathon, id)
+async def delete_hackathon(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Hackathon, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
+    await entity_cache.invalidate("hackathon", id)
+    await entity_cache.invalidate("team")
+    await entity_cache.invalidate("task")
+    await entity_cache.invalidate("solution")
     return JSONResponse(
         content={"message": "Hackathon was successfully deleted"}
     )
 
 @hackathon_router.get("/{hack_id}/teams", response_model=List[TeamResponse])
-def get_hackathon_team_list(hack_id: int, session=Depends(get_session)) -> List[Team]:
-    hackathon = session.get(Hackathon, hack_id)
-    if not hackathon:
+async def get_hackathon_team_list(
+    hack_id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[Team]:
+    hackathon_version = (await session.exec(select(Hackathon.version).where(Hackathon.id == hack_id))).first()
+    if hackathon_version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
-    return hackathon.teams
+    # пары (id, version) команд страницы и их участников: по сумме версий
+    # разные наборы строк могли давать одинаковый ETag
+    page_ids = keyset_page(select(Team.id).where(Team.hackathon_id == hack_id), Team.id, page).subquery()
+    query = select(Team.id, Team.version, User.id, User.version) \
+            .outerjoin(Teammate, Teammate.team_id == Team.id) \
+            .outerjoin(User, User.id == Teammate.user_id) \
+            .where(Team.id.in_(select(page_ids.c.id))) \
+            .order_by(Team.id, User.id)
+    versions = [tuple(row) for row in (await session.exec(query)).all()]
+    etag = make_etag(hack_id, page.limit, page.after, hackathon_version, versions)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+    query = select(Team) \
+            .where(Team.hackathon_id == hack_id) \
+            .options(*TEAM_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, Team.id, page, response)
 
 @hackathon_router.get("/{id}/solutions", response_model=List[TeamTaskSolutionResponse])
-def get_hackathon_solutions(id: int, session=Depends(get_session)) -> List[TeamTaskSolution]:
-    hackathon = session.get(Hackathon, id)
+async def get_hackathon_solutions(
+    id: int,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[TeamTaskSolution]:
+    hackathon = await session.get(Hackathon, id)
+    if not hackathon:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Hackathon was not found"
+        )
+    query = select(TeamTaskSolution) \
+            .join(Task, TeamTaskSolution.task_id == Task.id) \
+            .where(Task.hackathon_id == id) \
+            .options(*SOLUTION_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, TeamTaskSolution.id, page, response)
+
+@hackathon_router.get("/{id}/solutions/export")
+async def export_hackathon_solutions(
+    id: int,
+    format: ExportFormat = "ndjson",
+    session=Depends(get_async_session)
+):
+    hackathon = await session.get(Hackathon, id)
     if not hackathon:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,5 +205,7 @@ def get_hackathon_solutions(id: int, session=Depends(get_session)) -> List[TeamT
         )
     query = select(TeamTaskSolution) \
             .join(Task, TeamTaskSolution.task_id == Task.id) \
-            .where(Task.hackathon_id == id)
-    return session.exec(query)
+            .where(Task.hackathon_id == id) \
+            .options(*SOLUTION_RESPONSE_OPTIONS) \
+            .order_by(TeamTaskSolution.id)
+    return export_response(query, format, TeamTaskSolutionResponse, TeamTaskSolution, f"hackathon_{id}_solutions")
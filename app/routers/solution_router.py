@@ -1,15 +1,24 @@
-from fastapi import Depends, HTTPException, APIRouter
+from fastapi import Depends, HTTPException, APIRouter, Response
 from fastapi.responses import JSONResponse
-from db.db import get_session
+from db.db import get_async_session
 from db.models import *
+from db.loaders import *
+from db.pagination import PageParams, fetch_page
+from db.bulk import check_bulk_size, existing_ids, bulk_insert
+from dto.GeneralDto import BulkCreateResponse
+from cache.entity_cache import entity_cache, get_cached
+from sqlmodel import select
 from starlette import status
 
 fix_router = APIRouter(prefix="/fix", tags=["fixes"])
 solution_router = APIRouter(prefix="/solution", tags=["solutions"])
 
 @solution_router.get("/{id}", response_model=TeamTaskSolutionResponse)
-def get_solution_by_id(id: int, session=Depends(get_session)) -> TeamTaskSolution:
-    db_record = session.get(TeamTaskSolution, id)
+async def get_solution_by_id(id: int, session=Depends(get_async_session)) -> dict:
+    db_record = await get_cached(
+        "solution", id, TeamTaskSolutionResponse,
+        lambda: session.get(TeamTaskSolution, id, options=SOLUTION_RESPONSE_OPTIONS)
+    )
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -18,26 +27,38 @@ def get_solution_by_id(id: int, session=Depends(get_session)) -> TeamTaskSolutio
     return db_record
 
 @solution_router.post("/create")
-def create_solution(model: TeamTaskSolutionDefault, session=Depends(get_session)) -> JSONResponse:
+async def create_solution(model: TeamTaskSolutionDefault, session=Depends(get_async_session)) -> JSONResponse:
     model = TeamTaskSolution.model_validate(model)
-    team = session.get(Team, model.team_id)
-    task = session.get(Task, model.task_id)
+    team = await session.get(Team, model.team_id)
+    task = await session.get(Task, model.task_id)
     if not team or not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team and/or task was not found"
         )
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
     return JSONResponse(
         content={"message": "Solution was successfully crated"},
         status_code=status.HTTP_201_CREATED
     )
 
+@solution_router.post("/bulk_create", response_model=BulkCreateResponse)
+async def bulk_create_solutions(models: List[TeamTaskSolutionDefault], session=Depends(get_async_session)) -> BulkCreateResponse:
+    check_bulk_size(models)
+    team_ids = await existing_ids(session, Team.id, [model.team_id for model in models])
+    task_ids = await existing_ids(session, Task.id, [model.task_id for model in models])
+
+    def validate(model):
+        if model.team_id not in team_ids or model.task_id not in task_ids:
+            return "Team and/or task was not found"
+
+    return await bulk_insert(session, TeamTaskSolution, models, validate)
+
 @solution_router.patch("/update")
-def update_solution(id: int, model: TeamTaskSolutionDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(TeamTaskSolution, id)
+async def update_solution(id: int, model: TeamTaskSolutionDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(TeamTaskSolution, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -46,64 +67,75 @@ def update_solution(id: int, model: TeamTaskSolutionDefault, session=Depends(get
     data = Task.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = TeamTaskSolution.version + 1
     # pls stop dude
     try:
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
     except:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team and/or task was not found"
         )
+    await entity_cache.invalidate("solution", id)
     return JSONResponse(
         content={"message": "Solution was successfully updated"}
     )
 
 @solution_router.delete("/{id}")
-def delete_solution(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(TeamTaskSolution, id)
+async def delete_solution(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(TeamTaskSolution, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Solution was not found"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
+    await entity_cache.invalidate("solution", id)
     return JSONResponse(
         content={"message": "Solution was successfully deleted"}
     )
 
 @solution_router.get("/{id}/fixes", response_model=List[SolutionFixResponse])
-def get_solution_fixes(id: int, session=Depends(get_session)) -> List[SolutionFix]:
-    solution = session.get(TeamTaskSolution, id)
+async def get_solution_fixes(
+    id: int,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[SolutionFix]:
+    solution = await session.get(TeamTaskSolution, id)
     if not solution:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Solution was not found"
         )
-    return solution.fixes
+    query = select(SolutionFix) \
+            .where(SolutionFix.solution_id == id) \
+            .options(*FIX_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, SolutionFix.id, page, response)
 
 @fix_router.post("/create")
-def create_solution_fix(model: SolutionFixDefault, session=Depends(get_session)) -> JSONResponse:
+async def create_solution_fix(model: SolutionFixDefault, session=Depends(get_async_session)) -> JSONResponse:
     model = SolutionFix.model_validate(model)
-    solution = session.get(TeamTaskSolution, model.solution_id)
+    solution = await session.get(TeamTaskSolution, model.solution_id)
     if not solution:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Solution was not found"
         )
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
     return JSONResponse(
         content={"message": "Fix was successfully created"},
         status_code=status.HTTP_201_CREATED
     )
 
 @fix_router.patch("/update")
-def update_solution_fix(id: int, model: SolutionFixDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(SolutionFix, id)
+async def update_solution_fix(id: int, model: SolutionFixDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(SolutionFix, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -112,10 +144,11 @@ def update_solution_fix(id: int, model: SolutionFixDefault, session=Depends(get_
     data = SolutionFix.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = SolutionFix.version + 1
     try:
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
     except:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -126,15 +159,15 @@ def update_solution_fix(id: int, model: SolutionFixDefault, session=Depends(get_
     )
 
 @fix_router.delete("/{id}")
-def delete_solution_fix(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(SolutionFix, id)
+async def delete_solution_fix(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(SolutionFix, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Solution fix was not found"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
     return JSONResponse(
         content={"message": "Solution fix was successfully"},
         status_code=status.HTTP_201_CREATED
@@ -1,31 +1,51 @@
-from fastapi import Depends, HTTPException, APIRouter
+from fastapi import Depends, HTTPException, APIRouter, Response
 from fastapi.responses import JSONResponse
-from db.db import get_session
+from db.db import get_async_session
 from db.models import *
+from db.loaders import *
+from db.pagination import PageParams, fetch_page
+from db.bulk import check_bulk_size, existing_ids, bulk_insert
+from dto.GeneralDto import BulkCreateResponse
+from cache.entity_cache import entity_cache, get_cached
+from sqlmodel import select
 from starlette import status
 
 task_router = APIRouter(prefix="/task", tags=["tasks"])
 
 @task_router.post("/create")
-def create_task(model: TaskDefault, session=Depends(get_session)) -> JSONResponse:
+async def create_task(model: TaskDefault, session=Depends(get_async_session)) -> JSONResponse:
     model = Task.model_validate(model)
-    hackathon = session.get(Hackathon, model.hackathon_id)
+    hackathon = await session.get(Hackathon, model.hackathon_id)
     if not hackathon:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
     return JSONResponse(
         content={"message": "Task was successfully created"},
         status_code=status.HTTP_201_CREATED
     )
 
+@task_router.post("/bulk_create", response_model=BulkCreateResponse)
+async def bulk_create_tasks(models: List[TaskDefault], session=Depends(get_async_session)) -> BulkCreateResponse:
+    check_bulk_size(models)
+    hackathon_ids = await existing_ids(session, Hackathon.id, [model.hackathon_id for model in models])
+
+    def validate(model):
+        if model.hackathon_id not in hackathon_ids:
+            return "Hackathon was not found"
+
+    return await bulk_insert(session, Task, models, validate)
+
 @task_router.get("/{id}", response_model=TaskResponse)
-def get_task_by_id(id: int, session=Depends(get_session)) -> Task:
-    db_record = session.get(Task, id)
+async def get_task_by_id(id: int, session=Depends(get_async_session)) -> dict:
+    db_record = await get_cached(
+        "task", id, TaskResponse,
+        lambda: session.get(Task, id, options=TASK_RESPONSE_OPTIONS)
+    )
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -34,8 +54,8 @@ def get_task_by_id(id: int, session=Depends(get_session)) -> Task:
     return db_record
 
 @task_router.patch("/update")
-def update_task(id: int, model: TaskDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Task, id)
+async def update_task(id: int, model: TaskDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Task, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,40 +64,53 @@ def update_task(id: int, model: TaskDefault, session=Depends(get_session)) -> JS
     data = Task.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = Task.version + 1
     # fix this try-except lol
     try:
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
     except:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
+    await entity_cache.invalidate("task", id)
+    await entity_cache.invalidate("solution")
     return JSONResponse(
         content={"message": "Task was successfully updated"}
     )
 
 @task_router.delete("/{id}")
-def delete_task(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Task, id)
+async def delete_task(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Task, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task was not found"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
+    await entity_cache.invalidate("task", id)
+    await entity_cache.invalidate("solution")
     return JSONResponse(
         content={"message": "Task was successfully deleted"}
     )
 
 @task_router.get("/{id}/solutions", response_model=List[TeamTaskSolutionResponse])
-def get_task_solutions(id: int, session=Depends(get_session)) -> List[TeamTaskSolution]:
-    task = session.get(Task, id)
+async def get_task_solutions(
+    id: int,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[TeamTaskSolution]:
+    task = await session.get(Task, id)
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task was not found"
         )
-    return task.solutions
+    query = select(TeamTaskSolution) \
+            .where(TeamTaskSolution.task_id == id) \
+            .options(*SOLUTION_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, TeamTaskSolution.id, page, response)
@@ -1,14 +1,25 @@
-from fastapi import Depends, HTTPException, APIRouter
+from fastapi import Depends, HTTPException, APIRouter, Request, Response
 from fastapi.responses import JSONResponse
-from db.db import get_session
+from db.db import get_async_session
 from db.models import *
+from db.loaders import *
+from db.pagination import PageParams, fetch_page, keyset_page
+from db.bulk import check_bulk_size, existing_ids, bulk_insert
+from dto.GeneralDto import BulkCreateResponse
+from db.etag import make_etag, is_not_modified, not_modified_response
+from sqlalchemy import tuple_, update
+from cache.entity_cache import entity_cache, get_cached
+from sqlmodel import select
 from starlette import status
 
 team_router = APIRouter(prefix="/team", tags=["teams"])
 
 @team_router.get("/{id}", response_model=TeamResponse)
-def get_team_by_id(id: int, session=Depends(get_session)) -> Team:
-    db_record = session.get(Team, id)
+async def get_team_by_id(id: int, session=Depends(get_async_session)) -> dict:
+    db_record = await get_cached(
+        "team", id, TeamResponse,
+        lambda: session.get(Team, id, options=TEAM_RESPONSE_OPTIONS)
+    )
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -17,25 +28,36 @@ def get_team_by_id(id: int, session=Depends(get_session)) -> Team:
     return db_record
 
 @team_router.post("/create")
-def create_team(model: TeamDefault, session=Depends(get_session)) -> JSONResponse:
+async def create_team(model: TeamDefault, session=Depends(get_async_session)) -> JSONResponse:
     model = Team.model_validate(model)
-    hackathon = session.get(Hackathon, model.hackathon_id)
+    hackathon = await session.get(Hackathon, model.hackathon_id)
     if not hackathon:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    await session.commit()
+    await session.refresh(model)
     return JSONResponse(
         content={"message": "Team was successfully created"},
         status_code=status.HTTP_201_CREATED
     )
 
+@team_router.post("/bulk_create", response_model=BulkCreateResponse)
+async def bulk_create_teams(models: List[TeamDefault], session=Depends(get_async_session)) -> BulkCreateResponse:
+    check_bulk_size(models)
+    hackathon_ids = await existing_ids(session, Hackathon.id, [model.hackathon_id for model in models])
+
+    def validate(model):
+        if model.hackathon_id not in hackathon_ids:
+            return "Hackathon was not found"
+
+    return await bulk_insert(session, Team, models, validate)
+
 @team_router.patch("/update")
-def update_team(id: int, model: TeamDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Team, id)
+async def update_team(id: int, model: TeamDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Team, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,92 +66,163 @@ def update_team(id: int, model: TeamDefault, session=Depends(get_session)) -> JS
     data = Team.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = Team.version + 1
     # pls remove this try i pray thee
     try:
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
     except:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Hackathon was not found"
         )
+    await entity_cache.invalidate("team", id)
+    await entity_cache.invalidate("solution")
     return JSONResponse(
         content={"message": "Team was successfully updated"},
         status_code=status.HTTP_200_OK
     )
 
 @team_router.delete("/{id}")
-def delete_team(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(Team, id)
+async def delete_team(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(Team, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team was not found"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
+    await entity_cache.invalidate("team", id)
+    await entity_cache.invalidate("solution")
     return JSONResponse(
         content={"message": "Team was successfully deleted"},
         status_code=status.HTTP_200_OK
     )
 
 @team_router.post("/add_user")
-def create_teammate(model: Teammate, session=Depends(get_session)) -> JSONResponse:
+async def create_teammate(model: Teammate, session=Depends(get_async_session)) -> JSONResponse:
     model = Teammate.model_validate(model)
-    team = session.get(Team, model.team_id)
-    user = session.get(User, model.user_id)
+    team = await session.get(Team, model.team_id)
+    user = await session.get(User, model.user_id)
     if not team or not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team and/or user was not found"
         )
-    possible_teammate = session.get(Teammate, (model.team_id, model.user_id))
+    possible_teammate = await session.get(Teammate, (model.team_id, model.user_id))
     if possible_teammate:
         return JSONResponse(
             content={"User already in this team"},
             status_code=status.HTTP_202_ACCEPTED
         )
+    team.version = Team.version + 1
     session.add(model)
-    session.commit()
-    session.refresh(model)
+    session.add(team)
+    await session.commit()
+    await session.refresh(model)
+    await entity_cache.invalidate("team", model.team_id)
     return JSONResponse(
         content={"User was added in team successfully"},
         status_code=status.HTTP_201_CREATED
     )
 
+@team_router.post("/bulk_add_user", response_model=BulkCreateResponse)
+async def bulk_create_teammates(models: List[Teammate], session=Depends(get_async_session)) -> BulkCreateResponse:
+    check_bulk_size(models)
+    team_ids = await existing_ids(session, Team.id, [model.team_id for model in models])
+    user_ids = await existing_ids(session, User.id, [model.user_id for model in models])
+    pairs = {(model.team_id, model.user_id) for model in models}
+    query = select(Teammate.team_id, Teammate.user_id) \
+            .where(tuple_(Teammate.team_id, Teammate.user_id).in_(pairs))
+    existing_pairs = {tuple(row) for row in (await session.exec(query)).all()} if pairs else set()
+    changed_team_ids = set()
+
+    def validate(model):
+        if model.team_id not in team_ids or model.user_id not in user_ids:
+            return "Team and/or user was not found"
+        pair = (model.team_id, model.user_id)
+        if pair in existing_pairs:
+            return "User already in this team"
+        existing_pairs.add(pair)
+        changed_team_ids.add(model.team_id)
+
+    # версии команд увеличиваются в той же транзакции, что и вставка
+    async def bump_team_versions():
+        if changed_team_ids:
+            await session.execute(
+                update(Team)
+                .where(Team.id.in_(changed_team_ids))
+                .values(version=Team.version + 1)
+            )
+
+    result = await bulk_insert(session, Teammate, models, validate, before_commit=bump_team_versions)
+    await entity_cache.invalidate("team")
+    return result
+
 @team_router.delete("/remove_user")
-def delete_teammate(model: Teammate, id: int=None, session=Depends(get_session)) -> JSONResponse:
+async def delete_teammate(model: Teammate, id: int=None, session=Depends(get_async_session)) -> JSONResponse:
     model = Teammate.model_validate(model)
-    db_record = session.get(Teammate, (model.team_id, model.user_id))
+    db_record = await session.get(Teammate, (model.team_id, model.user_id))
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not in team"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.execute(
+        update(Team)
+        .where(Team.id == model.team_id)
+        .values(version=Team.version + 1)
+    )
+    await session.commit()
+    await entity_cache.invalidate("team", model.team_id)
     return JSONResponse(
         content={"message": "User was removed from team successfully"}
     )
 
 @team_router.get("/{id}/users", response_model=List[UserResponse])
-def get_team_users(id: int, session=Depends(get_session)) -> List[User]:
-    team = session.get(Team, id)
-    if not team:
+async def get_team_users(
+    id: int,
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[User]:
+    team_version = (await session.exec(select(Team.version).where(Team.id == id))).first()
+    if team_version is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team was not found"
         )
-    users = team.users
-    return users
+    query = select(User.id, User.version) \
+            .join(Teammate, Teammate.user_id == User.id) \
+            .where(Teammate.team_id == id)
+    versions = [tuple(row) for row in (await session.exec(keyset_page(query, User.id, page))).all()]
+    etag = make_etag(id, page.limit, page.after, team_version, versions)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+    query = select(User) \
+            .join(Teammate, Teammate.user_id == User.id) \
+            .where(Teammate.team_id == id)
+    return await fetch_page(session, query, User.id, page, response)
 
 @team_router.get("/{id}/solutions", response_model=List[TeamTaskSolutionResponse])
-def get_team_solutions(id: int, session=Depends(get_session)) -> List[TeamTaskSolution]:
-    team = session.get(Team, id)
+async def get_team_solutions(
+    id: int,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[TeamTaskSolution]:
+    team = await session.get(Team, id)
     if not team:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team was not found"
         )
-    return team.solutions
+    query = select(TeamTaskSolution) \
+            .where(TeamTaskSolution.team_id == id) \
+            .options(*SOLUTION_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, TeamTaskSolution.id, page, response)
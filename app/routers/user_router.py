@@ -1,8 +1,13 @@
-from fastapi import Depends, APIRouter, HTTPException
+from fastapi import Depends, APIRouter, HTTPException, Response
 from fastapi.responses import JSONResponse
-from auth.auth_handler import get_current_user_id, get_password_hash
-from db.db import get_session
+from auth.auth_handler import get_current_user_id
+from auth.password_hasher import password_hasher
+from db.db import get_async_session
 from db.models import *
+from db.loaders import *
+from db.pagination import PageParams, fetch_page
+from db.export import ExportFormat, export_response
+from cache.entity_cache import entity_cache, get_cached
 from dto.GeneralDto import PasswordChangeResponse, UserPasswordChange
 from sqlmodel import select
 from starlette import status
@@ -10,19 +15,19 @@ from starlette import status
 user_router = APIRouter(prefix="/user", tags=["user"])
 
 @user_router.get("/me", response_model=UserResponse)
-def get_me(
-    session=Depends(get_session),
+async def get_me(
+    session=Depends(get_async_session),
     user_id=Depends(get_current_user_id)
 ):
-    return session.get(User, user_id)
+    return await session.get(User, user_id)
 
 @user_router.post(
         "/change-password",
         response_model=PasswordChangeResponse
         )
-def change_password(
+async def change_password(
     data: UserPasswordChange,
-    session=Depends(get_session),
+    session=Depends(get_async_session),
     user_id=Depends(get_current_user_id)
 ):
     if data.password != data.password_confirm:
@@ -30,26 +35,49 @@ def change_password(
             status_code=400,
             detail="Пароли не совпадают"
         )
-    db_record = session.get(User, user_id)
-    password_hash = get_password_hash(data.password)
+    db_record = await session.get(User, user_id)
+    password_hash = await password_hasher.hash(data.password)
     db_record.password = password_hash
+    db_record.version = User.version + 1
     try:
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
     except Exception:
         return {"success": False}
+    await entity_cache.invalidate("user", user_id)
+    await entity_cache.invalidate("hackathon")
+    await entity_cache.invalidate("team")
     return {"success": True}
 
 @user_router.get("/list", response_model=List[UserResponse])
-def get_user_list(
-    session=Depends(get_session)
+async def get_user_list(
+    response: Response,
+    role: UserRole | None = None,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
 ) -> List[User]:
-    return session.exec(select(User)).all()
+    query = select(User)
+    if role is not None:
+        query = query.where(User.role == role)
+    return await fetch_page(session, query, User.id, page, response)
+
+@user_router.get("/list/export")
+async def export_user_list(
+    format: ExportFormat = "ndjson",
+    role: UserRole | None = None
+):
+    query = select(User).order_by(User.id)
+    if role is not None:
+        query = query.where(User.role == role)
+    return export_response(query, format, UserResponse, User, "users")
 
 @user_router.get("/{id}", response_model=UserResponse)
-def get_user_by_id(id: int, session=Depends(get_session)) -> User:
-    db_record = session.get(User, id)
+async def get_user_by_id(id: int, session=Depends(get_async_session)) -> dict:
+    db_record = await get_cached(
+        "user", id, UserResponse,
+        lambda: session.get(User, id)
+    )
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,8 +86,8 @@ def get_user_by_id(id: int, session=Depends(get_session)) -> User:
     return db_record
 
 @user_router.patch("/update")
-def update_user(id: int, model: UserDefault, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(User, id)
+async def update_user(id: int, model: UserDefault, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(User, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -68,34 +96,49 @@ def update_user(id: int, model: UserDefault, session=Depends(get_session)) -> JS
     data = User.model_dump(model, exclude_unset=True)
     for key, value in data.items():
         setattr(db_record, key, value)
+    db_record.version = User.version + 1
     session.add(db_record)
-    session.commit()
-    session.refresh(db_record)
+    await session.commit()
+    await session.refresh(db_record)
+    await entity_cache.invalidate("user", id)
+    await entity_cache.invalidate("hackathon")
+    await entity_cache.invalidate("team")
     return JSONResponse(
         content={"message": "User was successfully updated"}
     )
 
 @user_router.delete("/{id}")
-def delete_user(id: int, session=Depends(get_session)) -> JSONResponse:
-    db_record = session.get(User, id)
+async def delete_user(id: int, session=Depends(get_async_session)) -> JSONResponse:
+    db_record = await session.get(User, id)
     if not db_record:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User was not found!"
         )
-    session.delete(db_record)
-    session.commit()
+    await session.delete(db_record)
+    await session.commit()
+    await entity_cache.invalidate("user", id)
+    for kind in ("hackathon", "team", "task", "solution"):
+        await entity_cache.invalidate(kind)
     return JSONResponse(
         content={"message": "User was successfully deleted"}
     )
 
 @user_router.get("/{id}/teams", response_model=List[TeamResponse])
-def get_user_teams(id: int, session=Depends(get_session)) -> List[Team]:
-    user = session.get(User, id)
+async def get_user_teams(
+    id: int,
+    response: Response,
+    page: PageParams = Depends(),
+    session=Depends(get_async_session)
+) -> List[Team]:
+    user = await session.get(User, id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User was not found"
         )
-    teams = user.teams
-    return teams
+    query = select(Team) \
+            .join(Teammate, Teammate.team_id == Team.id) \
+            .where(Teammate.user_id == id) \
+            .options(*TEAM_RESPONSE_OPTIONS)
+    return await fetch_page(session, query, Team.id, page, response)
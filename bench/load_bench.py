@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+from time import time
+
+import aiohttp
+
+# нагрузочный бенчмарк основного приложения: запускается против поднятого
+# main-app до и после изменений, сравниваются запросы/сек и задержки
+BASE_URL = "http://localhost:9000"
+PATHS = ["/hackathon/list", "/hackathon/1", "/hackathon/1/teams"]
+CLIENTS = 200
+REQUESTS_PER_CLIENT = 25
+
+async def client(session, base_url, paths, count, latencies, errors):
+    for i in range(count):
+        path = paths[i % len(paths)]
+        start = time()
+        try:
+            async with session.get(base_url + path) as response:
+                await response.read()
+                if response.status >= 500:
+                    errors.append(response.status)
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+        latencies.append(time() - start)
+
+async def run(base_url, paths, clients, count):
+    latencies = []
+    errors = []
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start_time = time()
+        await asyncio.gather(*[
+            client(session, base_url, paths, count, latencies, errors)
+            for _ in range(clients)
+        ])
+        elapsed = time() - start_time
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{clients} - клиентов, {total} - запросов, {len(errors)} - ошибок")
+    print(f"{total / elapsed:.1f} - запросов/с")
+    print(f"{latencies[total // 2] * 1000:.1f}мс. - p50")
+    print(f"{latencies[int(total * 0.99) - 1] * 1000:.1f}мс. - p99")
+    print(f"{elapsed}с. - время")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--requests", type=int, default=REQUESTS_PER_CLIENT)
+    parser.add_argument("paths", nargs="*", default=PATHS)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.paths, args.clients, args.requests))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+import httpx
+import requests
+
+# сравнение старого способа проксирования в parser-app (новая requests.Session
+# на каждый вызов в пуле потоков) с общим httpx.AsyncClient с keep-alive
+URL = "http://localhost:9001/task/00000000-0000-0000-0000-000000000000"
+CALLS = 2000
+CONCURRENCY = 100
+
+def session_per_call(url):
+    session = requests.Session()
+    return session.get(url).status_code
+
+def bench_requests(url, calls, concurrency):
+    start_time = time()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(session_per_call, [url] * calls))
+    return time() - start_time
+
+async def bench_httpx(url, calls, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with semaphore:
+                return (await client.get(url)).status_code
+
+        start_time = time()
+        await asyncio.gather(*[call() for _ in range(calls)])
+        return time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=URL)
+    parser.add_argument("--calls", type=int, default=CALLS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    elapsed = bench_requests(args.url, args.calls, args.concurrency)
+    print(f"requests.Session на вызов: {elapsed}с., {args.calls / elapsed:.1f} запросов/с")
+    elapsed = asyncio.run(bench_httpx(args.url, args.calls, args.concurrency))
+    print(f"общий httpx.AsyncClient: {elapsed}с., {args.calls / elapsed:.1f} запросов/с")
+
+if __name__ == '__main__':
+    main()
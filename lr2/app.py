@@ -1,33 +1,66 @@
 import asyncio
-from fastapi import FastAPI, HTTPException
-from task2.parser import async_get_urls, async_fetch_parse_load
-from worker.worker import parse_url, celery_app
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import List
+from celery.states import PENDING, READY_STATES
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from task2.parser import SIZE, async_get_urls, close_http_session
+from task2.limiter import get_fetch_limiter_stats
+from task2.pipeline import crawl_urls, crawl_feed, ingest_feed, reparse_store, get_pipeline_stats, shutdown_parse_executor
+from task2.page_store import page_store
+from task2.writer import close_hackathon_writer
+from worker.worker import celery_app, enqueue_batch, enqueue_url, get_batch_status
+from worker.events import JobEvents
 
-app = FastAPI()
+CHUNK_SIZE = int(os.getenv("CRAWL_CHUNK_SIZE", 25))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_hackathon_writer()
+    await close_http_session()
+    shutdown_parse_executor()
+
+app = FastAPI(lifespan=lifespan)
+
+# обход успешен, только если ни одна стадия не теряла страниц
+def _crawl_ok(stages):
+    return not any(stages[stage]["failed"] for stage in ("fetch", "parse", "load"))
 
 @app.post("/parse")
 async def parse(size: int=10, slice: int=1):
     urls = await async_get_urls(size, slice)
-    tasks = []
+    stages = await crawl_urls(urls)
+    return {"ok": _crawl_ok(stages), "stages": stages}
 
-    for url in urls:
-        tasks.append(async_fetch_parse_load(url))
+@app.post("/parse_all")
+async def parse_all(size: int=Query(SIZE, ge=1)):
+    stages = await crawl_feed(size)
+    return {"ok": _crawl_ok(stages), "stages": stages}
 
-    await asyncio.gather(*tasks, return_exceptions=True)
-    return {"ok": True}
+@app.post("/ingest_feed")
+async def parse_feed_metadata(size: int=Query(SIZE, ge=1)):
+    stages = await ingest_feed(size)
+    return {"ok": _crawl_ok(stages), "stages": stages}
+
+@app.post("/reparse")
+async def reparse():
+    if page_store is None:
+        raise HTTPException(409, detail="Page store is disabled")
+    stages = await reparse_store(page_store)
+    return {"ok": _crawl_ok(stages), "stages": stages}
 
 @app.post("/parse_celery")
-async def parse_celery(size: int=10, slice: int=1):
+async def parse_celery(size: int=10, slice: int=1, chunk_size: int=Query(CHUNK_SIZE, ge=1)):
     urls = await async_get_urls(size, slice)
-    ids = []
-    for url in urls:
-        task = parse_url.delay(url)
-        ids.append(task.id)
-    return {"id": ids}
+    job = enqueue_batch(urls, chunk_size)
+    return {"id": job.id, "total": len(urls), "chunks": len(job.results)}
 
 @app.post("/parse_url")
 async def parse_celery_single_url(url: str):
-    task = parse_url.delay(url)
+    task = enqueue_url(url)
     return {"id": task.id}
 
 @app.get("/task/{task_id}")
@@ -36,3 +69,63 @@ async def get_task_status(task_id: str):
     if res.state == "FAILURE":
         raise HTTPException(500, detail=str(res.result))
     return {"state": res.state}
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "fetch": get_fetch_limiter_stats(),
+        "pipeline": get_pipeline_stats(),
+        "page_store": await asyncio.to_thread(page_store.stats) if page_store is not None else None,
+    }
+
+@app.get("/job/{job_id}")
+async def get_job_status(job_id: str):
+    status = get_batch_status(job_id)
+    if status is None:
+        raise HTTPException(404, detail="Job was not found")
+    return status
+
+def _job_state(job_id):
+    status = get_batch_status(job_id)
+    if status is not None:
+        return {"id": job_id, **status}
+    return {"id": job_id, "state": celery_app.AsyncResult(job_id).state}
+
+def _sse(event):
+    return f"event: state\ndata: {json.dumps(event)}\n\n"
+
+# SSE вместо опроса /task/{id}: сначала текущее состояние каждой задачи,
+# дальше только изменения из redis pub/sub; поток закрывается, когда все
+# задачи завершились
+async def _job_event_stream(job_ids):
+    async with JobEvents(job_ids) as events:
+        pending = set(job_ids)
+        for job_id in job_ids:
+            state = await asyncio.to_thread(_job_state, job_id)
+            yield _sse(state)
+            if state["state"] in READY_STATES:
+                pending.discard(job_id)
+        while pending:
+            event = await events.next()
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event)
+            if event.get("state") in READY_STATES:
+                pending.discard(event["id"])
+
+# PENDING у celery - и "в очереди", и "неизвестный id". Задачи и пачки
+# ставятся в состоянии QUEUED, поэтому PENDING здесь - неизвестный или
+# истекший id, для которого событий не будет и поток не закрылся бы
+@app.get("/events")
+async def stream_job_events(ids: List[str] = Query()):
+    ids = list(dict.fromkeys(ids))
+    states = await asyncio.to_thread(lambda: [_job_state(job_id) for job_id in ids])
+    unknown = [state["id"] for state in states if state["state"] == PENDING]
+    if unknown:
+        raise HTTPException(404, detail=f"Jobs were not found: {', '.join(unknown)}")
+    return StreamingResponse(
+        _job_event_stream(ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
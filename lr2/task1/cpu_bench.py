@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import platform
+import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from time import perf_counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# сколько чисел numpy складывает за раз, чтобы не держать в памяти весь arange
+NUMPY_CHUNK = 10_000_000
+
+def get_part_sum(start, end):
+    return sum(range(start, end))
+
+def get_part_sum_numpy(start, end):
+    total = 0
+    for chunk_start in range(start, end, NUMPY_CHUNK):
+        chunk_end = min(end, chunk_start + NUMPY_CHUNK)
+        total += int(numpy.arange(chunk_start, chunk_end, dtype=numpy.int64).sum())
+    return total
+
+def split(n, parts):
+    return [(1 + i * n // parts, 1 + (i + 1) * n // parts) for i in range(parts)]
+
+def gil_enabled():
+    check = getattr(sys, "_is_gil_enabled", None)
+    return check() if check else True
+
+# бэкенд получает n и число воркеров и возвращает сумму 1..n;
+# пулы создаются заранее и в замер не входят
+class Backend:
+    name = None
+
+    def available(self):
+        return None
+
+    def setup(self, workers):
+        pass
+
+    def run(self, n, workers):
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+class SequentialBackend(Backend):
+    name = "sequential"
+
+    def run(self, n, workers):
+        return get_part_sum(1, n + 1)
+
+class ExecutorBackend(Backend):
+    executor_class = None
+    func = staticmethod(get_part_sum)
+
+    def setup(self, workers):
+        self.executor = self.executor_class(workers)
+
+    def run(self, n, workers):
+        return sum(self.executor.map(self.func, *zip(*split(n, workers))))
+
+    def teardown(self):
+        self.executor.shutdown()
+
+class ThreadBackend(ExecutorBackend):
+    name = "threads"
+    executor_class = ThreadPoolExecutor
+
+class ProcessBackend(ExecutorBackend):
+    name = "processes"
+    executor_class = ProcessPoolExecutor
+
+# без GIL (сборка 3.13t) потоки должны масштабироваться так же, как процессы
+class FreeThreadedBackend(ThreadBackend):
+    name = "free-threaded"
+
+    def available(self):
+        if gil_enabled():
+            return "interpreter runs with the GIL"
+        return None
+
+class InterpreterBackend(ExecutorBackend):
+    name = "subinterpreters"
+    executor_class = getattr(concurrent.futures, "InterpreterPoolExecutor", None)
+
+    def available(self):
+        if self.executor_class is None:
+            return "InterpreterPoolExecutor requires Python 3.14+"
+        return None
+
+class AsyncioBackend(Backend):
+    name = "asyncio"
+
+    async def _gather(self, n, workers):
+        async def part(start, end):
+            return get_part_sum(start, end)
+        return sum(await asyncio.gather(*(part(start, end) for start, end in split(n, workers))))
+
+    def run(self, n, workers):
+        return asyncio.run(self._gather(n, workers))
+
+class NumpyBackend(ExecutorBackend):
+    name = "numpy"
+    executor_class = ThreadPoolExecutor
+    func = staticmethod(get_part_sum_numpy)
+
+    def available(self):
+        if numpy is None:
+            return "numpy is not installed"
+        return None
+
+BACKENDS = {
+    backend.name: backend
+    for backend in [SequentialBackend, ThreadBackend, ProcessBackend, AsyncioBackend,
+                    NumpyBackend, FreeThreadedBackend, InterpreterBackend]
+}
+
+def bench(backend, n, workers, repeat):
+    expected = n * (n + 1) // 2
+    backend.setup(workers)
+    try:
+        backend.run(n, workers)
+        times = []
+        for _ in range(repeat):
+            start_time = perf_counter()
+            total = backend.run(n, workers)
+            times.append(perf_counter() - start_time)
+            if total != expected:
+                raise ValueError(f"{backend.name}: {total} != {expected}")
+    finally:
+        backend.teardown()
+    return statistics.median(times)
+
+def parse_list(value):
+    return [int(item) for item in value.split(",")]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Масштабирование CPU-нагрузки sum(range(n)) по бэкендам")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--sizes", type=parse_list, default=[10_000_000, 100_000_000])
+    parser.add_argument("--workers", type=parse_list, default=None,
+                        help="по умолчанию 1, 2, 4, ... до числа ядер")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    return parser.parse_args()
+
+def default_workers():
+    cpus = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 <= cpus:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != cpus:
+        workers.append(cpus)
+    return workers
+
+def main():
+    args = parse_args()
+    worker_counts = args.workers or default_workers()
+    rows = []
+    skipped = {}
+
+    for n in args.sizes:
+        baseline = bench(SequentialBackend(), n, 1, args.repeat)
+        for name in args.backends.split(","):
+            backend = BACKENDS[name]()
+            reason = backend.available()
+            if reason:
+                skipped[name] = reason
+                continue
+            counts = [1] if name == "sequential" else worker_counts
+            for workers in counts:
+                elapsed = baseline if name == "sequential" else bench(backend, n, workers, args.repeat)
+                speedup = baseline / elapsed
+                rows.append({
+                    "size": n,
+                    "backend": name,
+                    "workers": workers,
+                    "time": round(elapsed, 4),
+                    "speedup": round(speedup, 2),
+                    "efficiency": round(speedup / workers, 2),
+                })
+
+    if args.json:
+        print(json.dumps({
+            "environment": {
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+                "gil_enabled": gil_enabled(),
+            },
+            "results": rows,
+            "skipped": skipped,
+        }, indent=2))
+        return
+
+    print(f"python {platform.python_version()}, ядер: {os.cpu_count()}, GIL: {gil_enabled()}")
+    print(f"{'size':>12} {'backend':>16} {'workers':>7} {'time, s':>9} {'speedup':>8} {'efficiency':>10}")
+    for row in rows:
+        print(f"{row['size']:>12} {row['backend']:>16} {row['workers']:>7} "
+              f"{row['time']:>9.4f} {row['speedup']:>8.2f} {row['efficiency']:>10.2f}")
+    for name, reason in skipped.items():
+        print(f"{name}: пропущен ({reason})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from aiohttp import web
+
+# без --load db краулер не ходит в базу, но модуль parser создает engine при импорте,
+# а воркер celery - async engine при старте (соединений он не открывает)
+os.environ.setdefault("POSTGRES_URL", "sqlite://")
+os.environ.setdefault("ASYNC_POSTGRES_URL", "postgresql+asyncpg://localhost/crawl_bench")
+# локальное хранилище страниц по умолчанию выключено, чтобы не мерить диск
+os.environ.setdefault("PAGE_STORE_DIR", "")
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+FEED_FIXTURE = FIXTURES_DIR / "getfeed.json"
+MODES = ["sequential", "threads", "processes", "asyncio", "celery"]
+
+# локальная замена сайта: отдает записанную ленту getfeed и html постов
+# из fixtures, с искусственной задержкой и долей ответов 503
+class StandInServer:
+    def __init__(self, feed, latency=0.0, error_rate=0.0, seed=None):
+        self.feed = feed
+        self.latency = latency
+        self.error_rate = error_rate
+        self.base_url = None
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._pages = {
+            post["url"]: (FIXTURES_DIR / post["fixture"]).read_text(encoding="utf-8")
+            for post in feed["posts"]
+        }
+        self._loop = None
+        self._thread = None
+
+    def start(self):
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base_url
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/api/getfeed/", self._feed)
+        app.router.add_get("/tpost/{name}", self._page)
+        runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        host, port = runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _feed(self, request):
+        await self._delay()
+        size = int(request.query.get("size", 20))
+        slice = int(request.query.get("slice", 1))
+        posts = self.feed["posts"][(slice - 1) * size:slice * size]
+        return web.json_response({
+            **self.feed,
+            "posts": [{**post, "url": self.base_url + post["url"]} for post in posts]
+        })
+
+    async def _page(self, request):
+        await self._delay()
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        page = self._pages.get(request.path)
+        if page is None:
+            return web.Response(status=404)
+        return web.Response(text=page, content_type="text/html")
+
+# --load none меряет только скачивание и парсинг, --load db - полный путь с записью
+def crawl_sync(url, load="none"):
+    from task2 import parser
+    try:
+        if load == "db":
+            return parser.fetch_parse_load(url)
+        data, status = parser._fetch_data(url)
+        if status != 200:
+            return False
+        parser._parse_html(data)
+        return True
+    except Exception:
+        return False
+
+async def _crawl_async(urls, load):
+    from task2 import parser
+    from task2.db import dispose_async_engine
+    from task2.writer import get_hackathon_writer, close_hackathon_writer
+
+    async def crawl(url):
+        if load == "db":
+            return await parser.async_fetch_parse_load(url)
+        data, status, _ = await parser._async_fetch_data(url)
+        parser._parse_html(data)
+        return True
+
+    try:
+        results = await asyncio.gather(*(crawl(url) for url in urls), return_exceptions=True)
+        if load == "db":
+            await get_hackathon_writer().join()
+    finally:
+        await close_hackathon_writer()
+        await parser.close_http_session()
+        await dispose_async_engine()
+    return [result is True for result in results]
+
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        self._threads = None
+        self._processes = None
+        self._celery = None
+
+    def unavailable(self, mode):
+        if mode == "celery":
+            try:
+                import celery
+            except ImportError:
+                return "celery is not installed"
+        return None
+
+    def run(self, mode, urls):
+        crawl = partial(crawl_sync, load=self.args.load)
+        if mode == "sequential":
+            return [crawl(url) for url in urls]
+        if mode == "threads":
+            self._threads = self._threads or ThreadPoolExecutor(self.args.workers)
+            return list(self._threads.map(crawl, urls))
+        if mode == "processes":
+            # spawn: после fork дети делили бы с родителем соединения requests-сессии
+            self._processes = self._processes or ProcessPoolExecutor(
+                self.args.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            return list(self._processes.map(crawl, urls))
+        if mode == "asyncio":
+            return asyncio.run(_crawl_async(urls, self.args.load))
+        if mode == "celery":
+            return self._run_celery(urls)
+        raise ValueError(f"Unknown mode {mode}")
+
+    def _run_celery(self, urls):
+        if self._celery is None:
+            from worker.worker import celery_app
+            celery_app.conf.update(task_always_eager=True, result_backend="cache+memory://")
+            self._celery = celery_app
+        from worker.worker import parse_urls
+        result = parse_urls.apply(args=[urls], kwargs={"load": self.args.load == "db"}).get()
+        return [outcome["status"] == "done" for outcome in result["results"]]
+
+    def close(self):
+        if self._threads:
+            self._threads.shutdown()
+        if self._processes:
+            self._processes.shutdown()
+        if self._celery:
+            from worker.worker import shutdown_worker_process
+            shutdown_worker_process()
+
+def bench_mode(runner, mode, urls, warmup, repeat):
+    for _ in range(warmup):
+        runner.run(mode, urls)
+    times = []
+    results = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        results = runner.run(mode, urls)
+        times.append(perf_counter() - start_time)
+    median = statistics.median(times)
+    return {
+        "pages": len(urls),
+        "ok": sum(1 for result in results if result),
+        "failed": sum(1 for result in results if not result),
+        "times": [round(t, 4) for t in times],
+        "min": round(min(times), 4),
+        "median": round(median, 4),
+        "mean": round(statistics.mean(times), 4),
+        "stdev": round(statistics.stdev(times), 4) if len(times) > 1 else 0.0,
+        "pages_per_sec": round(len(urls) / median, 2) if median else None,
+    }
+
+# в asyncio-режиме запросы идут через лимитер из limiter.py, а синхронные
+# режимы его не используют. Чтобы режимы сравнивались при одной
+# конкурентности, лимитер настраивается на --workers, а ограничение
+# частоты задается явно (0 - выключено)
+def fetch_settings(args):
+    return {
+        "FETCH_INITIAL_CONCURRENCY": args.workers,
+        "FETCH_MAX_CONCURRENCY": args.workers,
+        "FETCH_RATE_LIMIT": args.rate_limit,
+        "FETCH_BURST": max(1, args.workers),
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк режимов краулера на локальной копии сайта")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--size", type=int, default=None, help="сколько постов взять из ленты")
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа заглушки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503 на страницы")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="лимит запросов в секунду для asyncio-режима, 0 - без ограничения")
+    parser.add_argument("--load", choices=["none", "db"], default="none")
+    parser.add_argument("--live", action="store_true", help="ходить на настоящий сайт вместо заглушки")
+    parser.add_argument("--output", default=None, help="файл для JSON, по умолчанию stdout")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    feed = json.loads(FEED_FIXTURE.read_text(encoding="utf-8"))
+    size = args.size or (10 if args.live else len(feed["posts"]))
+
+    # до импорта task2: лимитер читает настройки при импорте
+    fetch = fetch_settings(args)
+    os.environ.update({key: str(value) for key, value in fetch.items()})
+
+    server = None
+    if not args.live:
+        server = StandInServer(feed, args.latency, args.error_rate, args.seed)
+        os.environ["FEED_HOST"] = server.start()
+
+    from task2.parser import get_urls
+    urls = get_urls(size, 1)
+    runner = Runner(args)
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            reason = runner.unavailable(mode)
+            if reason:
+                results[mode] = {"skipped": reason}
+                continue
+            results[mode] = bench_mode(runner, mode, urls, args.warmup, args.repeat)
+            print(f"{mode}: {results[mode]['pages_per_sec']} - страниц/с", file=sys.stderr)
+    finally:
+        runner.close()
+        if server:
+            server.stop()
+
+    report = {
+        "config": {
+            **{key: value for key, value in vars(args).items() if key != "output"},
+            "fetch": fetch,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "server": {"requests": server.requests, "errors": server.errors} if server else None,
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
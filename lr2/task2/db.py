@@ -10,7 +10,23 @@ db_url = os.getenv('POSTGRES_URL')
 async_db_url = os.getenv("ASYNC_POSTGRES_URL")
 
 engine = create_engine(db_url, echo=False)
+_async_engine = None
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(async_db_url, echo=False)
+    return _async_engine
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+
+def get_async_session():
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+FETCH_INITIAL_CONCURRENCY = int(os.getenv("FETCH_INITIAL_CONCURRENCY", 4))
+FETCH_MIN_CONCURRENCY = int(os.getenv("FETCH_MIN_CONCURRENCY", 1))
+FETCH_MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", 20))
+FETCH_TARGET_LATENCY = float(os.getenv("FETCH_TARGET_LATENCY", 2.0))
+FETCH_DECREASE_FACTOR = 0.5
+FETCH_RATE_LIMIT = float(os.getenv("FETCH_RATE_LIMIT", 20))
+FETCH_BURST = int(os.getenv("FETCH_BURST", 10))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", 3))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", 0.5))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", 30))
+
+# статусы, на которые источник отвечает под нагрузкой: повторяем запрос
+# и уменьшаем конкурентность
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# верхняя граница запросов в секунду, не зависит от конкурентности
+class TokenBucket:
+    def __init__(self, rate=FETCH_RATE_LIMIT, burst=FETCH_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # FETCH_RATE_LIMIT=0 - без ограничения
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+# AIMD: пока запросы отвечают быстрее целевой задержки, лимит растет примерно
+# на 1 за "окно" из limit запросов; на 429/5xx/таймаут или медленный ответ
+# лимит умножается на FETCH_DECREASE_FACTOR, не чаще раза за среднюю задержку
+class AdaptiveLimiter:
+    def __init__(self, initial=FETCH_INITIAL_CONCURRENCY, min_limit=FETCH_MIN_CONCURRENCY,
+                 max_limit=FETCH_MAX_CONCURRENCY, target_latency=FETCH_TARGET_LATENCY,
+                 bucket=None):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.bucket = bucket or TokenBucket()
+        self.in_flight = 0
+        self.latency = None
+        self.requests = 0
+        self.overloaded = 0
+        self.retries = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            # отмена во время ожидания токена: слот возвращается, иначе
+            # in_flight навсегда занимает часть лимита
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+            raise
+
+    async def release(self, latency, overloaded=False):
+        now = asyncio.get_running_loop().time()
+        self.requests += 1
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if overloaded:
+            self.overloaded += 1
+        async with self._condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.target_latency:
+                if now - self._last_decrease >= self.latency:
+                    self.limit = max(self.min_limit, self.limit * FETCH_DECREASE_FACTOR)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self):
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "overloaded": self.overloaded,
+            "retries": self.retries,
+            "avg_latency": round(self.latency, 3) if self.latency is not None else None,
+            "rate_limit": self.bucket.rate,
+        }
+
+def retry_after_seconds(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+# full jitter; Retry-After от источника важнее своей оценки
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = min(FETCH_BACKOFF_MAX, retry_after) + delay * 0.1
+    return delay
+
+# один лимитер на event loop, как и http-сессия
+_limiter = None
+_limiter_loop = None
+
+def get_fetch_limiter():
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        _limiter = AdaptiveLimiter()
+        _limiter_loop = loop
+    return _limiter
+
+def get_fetch_limiter_stats():
+    return _limiter.stats() if _limiter is not None else None
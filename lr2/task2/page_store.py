@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+# абсолютный путь: хранилище не должно зависеть от каталога запуска,
+# а в docker-compose сюда смонтирован общий том page_store
+PAGE_STORE_DIR = os.getenv("PAGE_STORE_DIR", str(Path(__file__).resolve().parent.parent / "page_store"))
+PAGE_STORE_MAX_BYTES = int(os.getenv("PAGE_STORE_MAX_BYTES", 256 * 1024 * 1024))
+PAGE_STORE_COMPRESS_LEVEL = 6
+
+logger = logging.getLogger(__name__)
+
+# локальное хранилище скачанных страниц для повторного парсинга без сети.
+# objects/ - тела страниц в gzip, имя файла - sha256 тела (одинаковые страницы
+# хранятся один раз), index/ - по файлу на url со ссылкой на последнее тело
+# и его ETag/Last-Modified. При превышении лимита удаляются давно
+# не записывавшиеся тела, их записи в индексе при чтении пропускаются.
+# Хранилище вспомогательное: ошибки диска логируются и не роняют обход
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+class PageStore:
+    def __init__(self, root=PAGE_STORE_DIR, max_bytes=PAGE_STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._objects = self.root / "objects"
+        self._index = self.root / "index"
+        self._size = None
+        self._objects_count = None
+        self._pages = None
+        self._lock = threading.Lock()
+
+    def _object_path(self, digest):
+        return self._objects / digest[:2] / f"{digest}.gz"
+
+    def _index_path(self, url):
+        return self._index / f"{_sha256(url.encode())}.json"
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def put(self, url, body, validators=None):
+        try:
+            return self._put(url, body, validators)
+        except OSError:
+            logger.exception("Failed to store page %s", url)
+            return None
+
+    def _put(self, url, body, validators):
+        data = body.encode("utf-8")
+        digest = _sha256(data)
+        path = self._object_path(digest)
+        added = 0
+        if path.exists():
+            os.utime(path)
+        else:
+            compressed = gzip.compress(data, PAGE_STORE_COMPRESS_LEVEL)
+            self._write(path, compressed)
+            added = len(compressed)
+        index_path = self._index_path(url)
+        new_page = not index_path.exists()
+        entry = {"url": url, "hash": digest, "fetched_at": time.time(), **(validators or {})}
+        self._write(index_path, json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        self._grow(added, new_page)
+        return digest
+
+    def _objects_by_age(self):
+        objects = []
+        for path in self._objects.glob("*/*.gz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, path))
+        objects.sort()
+        return objects
+
+    # счетчики считаются обходом каталога один раз, дальше обновляются
+    # при записи и вытеснении. Другие процессы, пишущие в тот же каталог,
+    # в них не видны, поэтому stats() приблизительная
+    def _scan(self):
+        if self._size is None:
+            objects = self._objects_by_age()
+            self._size = sum(size for _, size, _ in objects)
+            self._objects_count = len(objects)
+            self._pages = sum(1 for _ in self._index.glob("*.json"))
+
+    def _grow(self, added, new_page):
+        with self._lock:
+            if self._size is None:
+                self._scan()
+            else:
+                self._size += added
+                self._objects_count += 1 if added else 0
+                self._pages += 1 if new_page else 0
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        for _, size, path in self._objects_by_age():
+            if self._size <= target:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+            self._objects_count -= 1
+
+    def get(self, url):
+        try:
+            entry = json.loads(self._index_path(url).read_text(encoding="utf-8"))
+            return gzip.decompress(self._object_path(entry["hash"]).read_bytes()).decode("utf-8")
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def iter_pages(self):
+        for index_path in self._index.glob("*.json"):
+            try:
+                entry = json.loads(index_path.read_text(encoding="utf-8"))
+                body = gzip.decompress(self._object_path(entry["hash"]).read_bytes()).decode("utf-8")
+            except (FileNotFoundError, ValueError, OSError):
+                continue
+            yield entry, body
+
+    # первый вызов обходит каталог, поэтому из async-кода - через to_thread
+    def stats(self):
+        with self._lock:
+            self._scan()
+            return {
+                "pages": self._pages,
+                "objects": self._objects_count,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+# пустой PAGE_STORE_DIR отключает хранилище
+page_store = PageStore() if PAGE_STORE_DIR else None
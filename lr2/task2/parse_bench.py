@@ -0,0 +1,42 @@
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+# парсинг не обращается к базе, но модуль parser создает engine при импорте
+os.environ.setdefault("POSTGRES_URL", "sqlite://")
+
+from task2.parser import _parse_html, lxml
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+ROUNDS = 50
+ENGINES = ["soup", "strainer", "lxml"]
+
+def main():
+    pages = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES_DIR.glob("*.html"))]
+    expected = [_parse_html(page, engine="soup") for page in pages]
+    mismatched = False
+
+    for engine in ENGINES:
+        if engine == "lxml" and lxml is None:
+            print(f"{engine}: lxml не установлен, пропускаем")
+            continue
+        results = [_parse_html(page, engine=engine) for page in pages]
+        if results != expected:
+            print(f"{engine}: результат отличается от soup!")
+            mismatched = True
+            continue
+
+        start_time = perf_counter()
+        for _ in range(ROUNDS):
+            for page in pages:
+                _parse_html(page, engine=engine)
+        elapsed = perf_counter() - start_time
+        print(f"{engine}: {len(pages) * ROUNDS / elapsed:.1f} - страниц/с")
+
+    # hackathon_scripts.html проверяет, что движки одинаково пропускают script/style
+    if mismatched:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,247 @@
+import asyncio
+import hashlib
+import json
+import os
 import requests
 import random
 import string
 import aiohttp
 from .models import *
-from .db import get_session
-from bs4 import BeautifulSoup
+from sqlmodel import Session, select
+from .db import engine, get_async_session
+from .writer import get_hackathon_writer, dto_to_row
+from .page_store import page_store
+from .limiter import FETCH_MAX_CONCURRENCY, FETCH_RETRIES, RETRY_STATUSES, \
+    get_fetch_limiter, retry_after_seconds, backoff_delay
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime
 
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
 # парсим хакатоны.рус
 # всего записей 934 поэтому мы ограничены в ресурсах
-HOST = "https://feeds.tildacdn.com"  # сайт сделан на тильде и данные подтягиваются из апи тильды
+HOST = os.getenv("FEED_HOST", "https://feeds.tildacdn.com")  # сайт сделан на тильде и данные подтягиваются из апи тильды
 LIST_API_ENDPOINT = "/api/getfeed/?feeduid=617755803461&recid=488755787&c={timestamp}&size={size}&slice={slice}"
 SIZE = 20
 SLICE = 1
+FEED_PREFETCH = int(os.getenv("FEED_PREFETCH", 2))
 USER_AGENT = "".join(random.choices(string.ascii_letters, k=20))
 SESSION = requests.session()
 SESSION.headers["User-Agent"] = USER_AGENT
+# soup - полное дерево BeautifulSoup, strainer - только нужные теги,
+# lxml - xpath по дереву lxml (без lxml используется strainer)
+PARSE_ENGINE = os.getenv("PARSE_ENGINE", "lxml")
+
+# настройки общего aiohttp-соединения краулера
+FETCH_TIMEOUT = 10
+CONNECTOR_LIMIT = 100
+# реальную конкурентность по хосту регулирует адаптивный лимитер
+CONNECTOR_LIMIT_PER_HOST = FETCH_MAX_CONCURRENCY
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+# одна aiohttp-сессия на event loop: соединения (DNS, TCP, TLS) переиспользуются
+# между всеми запросами краулера, а не создаются заново на каждый url
+_http_session = None
+_http_session_loop = None
+
+def _create_http_session():
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTOR_LIMIT,
+        limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(FETCH_TIMEOUT),
+        headers={"User-Agent": USER_AGENT}
+    )
+
+async def get_http_session():
+    global _http_session, _http_session_loop
+    loop = asyncio.get_running_loop()
+    if _http_session is None or _http_session.closed or _http_session_loop is not loop:
+        _http_session = _create_http_session()
+        _http_session_loop = loop
+    return _http_session
+
+async def close_http_session():
+    global _http_session, _http_session_loop
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+    _http_session_loop = None
 
 def get_urls(size=SIZE, slice=SLICE):
     now_timestamp = int(datetime.timestamp(datetime.now()) * 1000)
     url = HOST + LIST_API_ENDPOINT.format(timestamp=now_timestamp, size=size, slice=slice)
     hackathons_list = SESSION.get(url).json()["posts"]
-    urls = [post["url"] for post in hackathons_list if "tpost" in post["url"]]
+    urls = list(dict.fromkeys(post["url"] for post in hackathons_list if "tpost" in post["url"]))
     return urls
 
-async def async_get_urls(size=SIZE, slice=SLICE):
-    session = aiohttp.ClientSession()
+async def _async_get_feed_page(size, slice):
+    session = await get_http_session()
     now_timestamp = int(datetime.timestamp(datetime.now()) * 1000)
     url = HOST + LIST_API_ENDPOINT.format(timestamp=now_timestamp, size=size, slice=slice)
-    response = await session.get(url)
-    json_data = await response.json()
-    await session.close()
-    hackathons_list = json_data["posts"]
-    urls = [post["url"] for post in hackathons_list if "tpost" in post["url"]]
+    async with session.get(url) as response:
+        json_data = await response.json()
+    return json_data["posts"]
+
+async def async_get_urls(size=SIZE, slice=SLICE):
+    hackathons_list = await _async_get_feed_page(size, slice)
+    urls = list(dict.fromkeys(post["url"] for post in hackathons_list if "tpost" in post["url"]))
     return urls
 
+# обход всей ленты: пока отдаются посты текущей страницы, следующие prefetch
+# страниц уже запрошены. Лента кончается на первой неполной странице
+async def async_iter_feed_pages(size=SIZE, prefetch=FEED_PREFETCH):
+    seen = set()
+    next_slice = 1
+    pending = []
+
+    def schedule():
+        nonlocal next_slice
+        pending.append(asyncio.create_task(_async_get_feed_page(size, next_slice)))
+        next_slice += 1
+
+    for _ in range(max(1, prefetch)):
+        schedule()
+    try:
+        while pending:
+            hackathons_list = await pending.pop(0)
+            if len(hackathons_list) < size:
+                for task in pending:
+                    task.cancel()
+                pending.clear()
+            else:
+                schedule()
+            posts = []
+            for post in hackathons_list:
+                if "tpost" in post["url"] and post["url"] not in seen:
+                    seen.add(post["url"])
+                    posts.append(post)
+            yield posts
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def async_iter_urls(size=SIZE, prefetch=FEED_PREFETCH):
+    async for posts in async_iter_feed_pages(size, prefetch):
+        for post in posts:
+            yield post["url"]
+
+# метаданные поста из ленты; если они не изменились, страницу не качаем
+FEED_HASH_FIELDS = ["url", "title", "descr", "text", "date", "published", "edited", "image"]
+
+def _feed_hash(post):
+    return _content_hash({field: post.get(field) for field in FEED_HASH_FIELDS})
+
 def _fetch_data(url):
     r = SESSION.get(url, headers={"User-Agent": USER_AGENT})
+    if page_store is not None and r.status_code == 200:
+        page_store.put(url, r.text, {
+            "http_etag": r.headers.get("ETag"),
+            "http_last_modified": r.headers.get("Last-Modified"),
+        })
     return r.text, r.status_code
 
-async def _async_fetch_data(url):
-    timeout = aiohttp.ClientTimeout(10)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(url, headers={"User-Agent": USER_AGENT}) as response:
-            response.raise_for_status()
-            return await response.text(), response.status
+async def _async_fetch_data(url, known=None):
+    session = await get_http_session()
+    headers = {}
+    if known and known.http_etag:
+        headers["If-None-Match"] = known.http_etag
+    if known and known.http_last_modified:
+        headers["If-Modified-Since"] = known.http_last_modified
+    limiter = get_fetch_limiter()
+    loop = asyncio.get_running_loop()
+    for attempt in range(FETCH_RETRIES + 1):
+        retry_after = None
+        overloaded = False
+        await limiter.acquire()
+        start = loop.time()
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status in RETRY_STATUSES:
+                    overloaded = True
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                    if attempt == FETCH_RETRIES:
+                        response.raise_for_status()
+                else:
+                    response.raise_for_status()
+                    validators = {
+                        "http_etag": response.headers.get("ETag"),
+                        "http_last_modified": response.headers.get("Last-Modified"),
+                    }
+                    if response.status == 304:
+                        return None, response.status, validators
+                    text = await response.text()
+                    if page_store is not None:
+                        await asyncio.to_thread(page_store.put, url, text, validators)
+                    return text, response.status, validators
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            overloaded = True
+            if attempt == FETCH_RETRIES:
+                raise
+        finally:
+            await limiter.release(loop.time() - start, overloaded)
+        limiter.retries += 1
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+async def _get_known_page(url):
+    query = select(Hackathon.http_etag, Hackathon.http_last_modified, Hackathon.content_hash) \
+            .where(Hackathon.source_url == url)
+    async with get_async_session() as session:
+        return (await session.exec(query)).first()
+
+# то же для пачки url одним запросом (повторный парсинг из хранилища)
+async def _get_known_pages(urls):
+    query = select(Hackathon.source_url, Hackathon.http_etag, Hackathon.http_last_modified, Hackathon.content_hash) \
+            .where(Hackathon.source_url.in_(urls))
+    async with get_async_session() as session:
+        return {row.source_url: row for row in (await session.exec(query)).all()}
+
+def _content_hash(dto):
+    return hashlib.sha256(json.dumps(dto, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+TITLE_CLASS = "js-feed-post-title t-feed__post-popup__title t-title t-title_xxs"
+DESCRIPTION_CLASS = "t-redactor__tte-view"
+# из всей страницы тильды нужны только заголовок и блок описания,
+# поэтому дерево строится только для них
+PAGE_STRAINER = SoupStrainer(attrs={
+    "class": lambda value: value is not None
+        and bool({"js-feed-post-title", DESCRIPTION_CLASS} & set(value.split()))
+})
 
-def _parse_html(data):
-    soup = BeautifulSoup(data, "html.parser")
+def _soup_blocks(soup):
+    title = soup.find("h1", attrs={"class": TITLE_CLASS}).text
+    descr = soup.find("div", attrs={"class": DESCRIPTION_CLASS})
+    return title, (block.text for block in descr.find_all("div"))
+
+# как и get_text() в bs4, text_content() не должен включать код из script/style;
+# разбор из байт с явной кодировкой, строка с объявлением encoding не парсится
+def _lxml_blocks(data):
+    tree = lxml.html.fromstring(data.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    lxml.etree.strip_elements(tree, "script", "style", with_tail=False)
+    title = tree.xpath("//h1[normalize-space(@class)=$cls]", cls=TITLE_CLASS)[0].text_content()
+    descr = tree.xpath(
+        "//div[contains(concat(' ', normalize-space(@class), ' '), $cls)]",
+        cls=f" {DESCRIPTION_CLASS} "
+    )[0]
+    return title, (block.text_content() for block in descr.iterdescendants("div"))
+
+def _extract_blocks(data, engine):
+    if engine == "lxml" and lxml is not None:
+        return _lxml_blocks(data)
+    if engine == "soup":
+        return _soup_blocks(BeautifulSoup(data, "html.parser"))
+    return _soup_blocks(BeautifulSoup(data, "html.parser", parse_only=PAGE_STRAINER))
+
+def _parse_html(data, engine=PARSE_ENGINE):
     dto = {
         "title": None,
         "description": None,
@@ -56,38 +250,29 @@ def _parse_html(data):
         "dates": None,
         "organizer_id": 1  # тестовый юзер
     }
-    dto["title"] = soup.find("h1", attrs={"class": "js-feed-post-title t-feed__post-popup__title t-title t-title_xxs"}).text.strip()
-    descr = soup.find("div", attrs={"class": "t-redactor__tte-view"})
-    descr_blocks = descr.find_all("div")
-    description = ""
-    for block in descr_blocks:
-        if "Дата проведения" in block.text:
-            dto["dates"] = block.text.split("Дата проведения")[1].split('\n')[0].strip()
-        if "Место проведения" in block.text:
-            dto["location"] = block.text.split("Место проведения:")[1].split('\n')[0].strip()
-        if "Регистрация до" in block.text:
+    title, texts = _extract_blocks(data, engine)
+    dto["title"] = title.strip()
+    description = []
+    for text in texts:
+        if "Дата проведения" in text:
+            dto["dates"] = text.split("Дата проведения")[1].split('\n')[0].strip()
+        if "Место проведения" in text:
+            dto["location"] = text.split("Место проведения:")[1].split('\n')[0].strip()
+        if "Регистрация до" in text:
             break
-        description += block.text + '\n'
-    dto["description"] = description
+        description.append(text + '\n')
+    dto["description"] = "".join(description)
     if not dto["location"]:
         dto["location"] = "Онлайн"
     
     return dto
 
 def _load_in_db(dto):
-    session = next(get_session())
-    data = HackathonDefault(
-        name=dto["title"],
-        description=dto["description"],
-        participant_conditions=dto["participant_conditions"],
-        location=dto["location"],
-        dates=dto["dates"],
-        organizer_id=dto["organizer_id"]
-    )
+    data = HackathonDefault(**dto_to_row(dto))
     model = Hackathon.model_validate(data)
-    session.add(model)
-    session.commit()
-    session.refresh(model)
+    with Session(engine) as session:
+        session.add(model)
+        session.commit()
 
 def fetch_parse_load(url):
     data, status = _fetch_data(url)
@@ -97,10 +282,29 @@ def fetch_parse_load(url):
     _load_in_db(data)
     return True
 
-async def async_fetch_parse_load(url):
-    data, status = await _async_fetch_data(url)
+# измененная страница получает url, хеш и валидаторы для upsert во writer;
+# неизмененная (тот же хеш и те же ETag/Last-Modified) не пишется вовсе
+def _prepare_for_load(url, known, data, validators):
+    content_hash = _content_hash(data)
+    if known and known.content_hash == content_hash \
+            and (known.http_etag, known.http_last_modified) == (validators["http_etag"], validators["http_last_modified"]):
+        return None
+    data.update(validators, source_url=url, content_hash=content_hash)
+    return data
+
+# повторный обход: страница запрашивается условно (If-None-Match /
+# If-Modified-Since), неизмененные страницы пропускаются, а измененные
+# обновляют существующую запись по source_url (upsert во writer)
+async def async_fetch_parse_load(url, writer=None):
+    known = await _get_known_page(url)
+    data, status, validators = await _async_fetch_data(url, known)
     if status == 404:
         return False
-    data = _parse_html(data)
-    _load_in_db(data)
+    if status == 304:
+        return True
+    data = _prepare_for_load(url, known, _parse_html(data), validators)
+    if data is None:
+        return True
+    writer = writer or get_hackathon_writer()
+    await writer.put(data)
     return True
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import bindparam, update
+from sqlmodel import select
+from .db import get_async_session
+from .limiter import FETCH_MAX_CONCURRENCY
+from .models import Hackathon
+from .parser import _async_fetch_data, _get_known_page, _get_known_pages, _parse_html, _prepare_for_load, _feed_hash, \
+    async_iter_feed_pages, async_iter_urls, SIZE
+from .writer import get_hackathon_writer, HackathonWriteError
+
+# os.cpu_count() - все ядра хоста, даже если процессу доступна их часть
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", _available_cpus()))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 100))
+REPARSE_BATCH_SIZE = int(os.getenv("REPARSE_BATCH_SIZE", 200))
+
+logger = logging.getLogger(__name__)
+
+# краулер из трех стадий, связанных ограниченными очередями:
+# fetch (async I/O) -> parse (пул процессов по числу ядер) -> load (HackathonWriter).
+# Парсинг больше не блокирует event loop, а по очередям видно узкое место
+
+_parse_executor = None
+
+def get_parse_executor():
+    global _parse_executor
+    if _parse_executor is None:
+        # spawn: fork из процесса с работающим event loop и потоками небезопасен
+        _parse_executor = ProcessPoolExecutor(
+            PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_executor
+
+def shutdown_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(cancel_futures=True)
+    _parse_executor = None
+
+class StageStats:
+    def __init__(self, queue=None):
+        self.queue = queue
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def snapshot(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "per_sec": round(self.processed / elapsed, 2) if elapsed else 0.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+class CrawlPipeline:
+    def __init__(self, writer=None, fetch_workers=FETCH_MAX_CONCURRENCY,
+                 parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, feed_hashes=None):
+        self.writer = writer
+        # feed_hashes - хеши ленты, которые пишутся вместе со строкой;
+        # unchanged - url, которые не изменились (304 или тот же хеш) и в writer не попали
+        self.feed_hashes = feed_hashes if feed_hashes is not None else {}
+        self.unchanged = set()
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self._stats = None
+        self._written = 0
+        self._write_failed = 0
+
+    async def run(self, urls):
+        return await self._run(urls, from_store=False)
+
+    # повторный парсинг из локального хранилища: стадия fetch не участвует,
+    # тела страниц сразу идут в parse, а load обновляет записи по source_url.
+    # Как и при обходе, страница с тем же хешем и валидаторами не пишется
+    async def reparse(self, store):
+        return await self._run(store.iter_pages(), from_store=True)
+
+    async def _run(self, source, from_store):
+        self.writer = self.writer or get_hackathon_writer()
+        self._written = self.writer.written
+        self._write_failed = self.writer.failed
+        fetch_queue = asyncio.Queue(self.queue_size)
+        parse_queue = asyncio.Queue(self.queue_size)
+        self._stats = {"fetch": StageStats(fetch_queue), "parse": StageStats(parse_queue)}
+        self._load_started = time.perf_counter()
+        self._load_finished = None
+
+        executor = get_parse_executor()
+        workers = [asyncio.create_task(self._fetch(fetch_queue, parse_queue)) for _ in range(self.fetch_workers)]
+        workers += [asyncio.create_task(self._parse(parse_queue, executor)) for _ in range(self.parse_workers)]
+        try:
+            if from_store:
+                await self._feed_from_store(source, parse_queue)
+            elif hasattr(source, "__aiter__"):
+                async for url in source:
+                    await fetch_queue.put(url)
+            else:
+                for url in source:
+                    await fetch_queue.put(url)
+            await fetch_queue.join()
+            self._stats["fetch"].finished = time.perf_counter()
+            await parse_queue.join()
+            self._stats["parse"].finished = time.perf_counter()
+            try:
+                await self.writer.join()
+            except HackathonWriteError:
+                # неудачные пачки уже посчитаны в load.failed
+                logger.exception("Crawl pipeline lost writes")
+            self._load_finished = time.perf_counter()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        stats = self.stats()
+        logger.info("Crawl pipeline finished: %s", stats)
+        return stats
+
+    # страницы читаются с диска пачками, и известные записи для пачки
+    # берутся одним IN-запросом, а не запросом на каждую страницу
+    async def _feed_from_store(self, pages, parse_queue):
+        stats = self._stats["fetch"]
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(pages, REPARSE_BATCH_SIZE)))
+            if not batch:
+                break
+            known = await _get_known_pages([entry["url"] for entry, _ in batch])
+            for entry, body in batch:
+                validators = {
+                    "http_etag": entry.get("http_etag"),
+                    "http_last_modified": entry.get("http_last_modified"),
+                }
+                await parse_queue.put((entry["url"], known.get(entry["url"]), body, validators))
+                stats.processed += 1
+
+    async def _fetch(self, fetch_queue, parse_queue):
+        stats = self._stats["fetch"]
+        while True:
+            url = await fetch_queue.get()
+            try:
+                known = await _get_known_page(url)
+                data, status, validators = await _async_fetch_data(url, known)
+                if status == 304:
+                    stats.skipped += 1
+                    self.unchanged.add(url)
+                else:
+                    await parse_queue.put((url, known, data, validators))
+                    stats.processed += 1
+            except Exception:
+                stats.failed += 1
+                logger.exception("Failed to fetch %s", url)
+            finally:
+                fetch_queue.task_done()
+
+    async def _parse(self, parse_queue, executor):
+        stats = self._stats["parse"]
+        loop = asyncio.get_running_loop()
+        while True:
+            url, known, data, validators = await parse_queue.get()
+            try:
+                dto = await loop.run_in_executor(executor, _parse_html, data)
+                dto = _prepare_for_load(url, known, dto, validators)
+                if dto is None:
+                    stats.skipped += 1
+                    self.unchanged.add(url)
+                else:
+                    if url in self.feed_hashes:
+                        dto["feed_hash"] = self.feed_hashes[url]
+                    await self.writer.put(dto)
+                    stats.processed += 1
+            except Exception:
+                stats.failed += 1
+                logger.exception("Failed to parse %s", url)
+            finally:
+                parse_queue.task_done()
+
+    def stats(self):
+        if self._stats is None:
+            return None
+        elapsed = (self._load_finished or time.perf_counter()) - self._load_started
+        written = self.writer.written - self._written
+        return {
+            **{name: stage.snapshot() for name, stage in self._stats.items()},
+            "load": {
+                "processed": written,
+                "skipped": 0,
+                "failed": self.writer.failed - self._write_failed,
+                "per_sec": round(written / elapsed, 2) if elapsed else 0.0,
+                "queue_depth": self.writer.queue_depth,
+            },
+        }
+
+# последний запущенный конвейер, для /metrics
+_pipeline = None
+
+async def crawl_urls(urls):
+    global _pipeline
+    _pipeline = CrawlPipeline()
+    return await _pipeline.run(urls)
+
+# страницы начинают качаться сразу по мере прихода url из ленты
+async def crawl_feed(size=SIZE):
+    return await crawl_urls(async_iter_urls(size))
+
+async def reparse_store(store):
+    global _pipeline
+    _pipeline = CrawlPipeline()
+    return await _pipeline.reparse(store)
+
+# режим "по ленте": в getfeed уже есть метаданные постов, и страница
+# качается только для новых постов и тех, чьи метаданные изменились.
+# Место и даты проведения есть только на странице, поэтому для новых
+# постов запрос страницы остается
+async def _known_feed_hashes(urls):
+    query = select(Hackathon.source_url, Hackathon.feed_hash).where(Hackathon.source_url.in_(urls))
+    async with get_async_session() as session:
+        return dict((await session.exec(query)).all())
+
+async def _iter_changed_urls(size, feed_hashes, counts):
+    async for posts in async_iter_feed_pages(size):
+        if not posts:
+            continue
+        hashes = {post["url"]: _feed_hash(post) for post in posts}
+        known = await _known_feed_hashes(list(hashes))
+        counts["posts"] += len(hashes)
+        for url, feed_hash in hashes.items():
+            if known.get(url) == feed_hash:
+                counts["unchanged"] += 1
+                continue
+            feed_hashes[url] = feed_hash
+            yield url
+
+async def _store_feed_hashes(feed_hashes):
+    if not feed_hashes:
+        return
+    table = Hackathon.__table__
+    statement = update(table) \
+        .where(table.c.source_url == bindparam("url")) \
+        .values(feed_hash=bindparam("hash"))
+    async with get_async_session() as session:
+        await session.execute(statement, [{"url": url, "hash": value} for url, value in feed_hashes.items()])
+        await session.commit()
+
+async def ingest_feed(size=SIZE):
+    global _pipeline
+    feed_hashes = {}
+    counts = {"posts": 0, "unchanged": 0}
+    _pipeline = CrawlPipeline(feed_hashes=feed_hashes)
+    stats = await _pipeline.run(_iter_changed_urls(size, feed_hashes, counts))
+    # хеш ленты записанных страниц уходит в той же строке upsert, здесь -
+    # только для неизмененных. Если страница не скачалась, не разобралась
+    # или не записалась, старый хеш остается и пост запросится снова
+    await _store_feed_hashes({url: feed_hashes[url] for url in _pipeline.unchanged if url in feed_hashes})
+    return {**stats, "feed": {**counts, "pages_requested": len(feed_hashes)}}
+
+def get_pipeline_stats():
+    return _pipeline.stats() if _pipeline is not None else None
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from .models import Hackathon
+from .db import get_async_session
+
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", 50))
+WRITER_FLUSH_INTERVAL = float(os.getenv("WRITER_FLUSH_INTERVAL", 1.0))
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", 500))
+
+logger = logging.getLogger(__name__)
+
+# спарсенные хакатоны складываются в ограниченную очередь, а отдельная задача
+# пишет их в базу пачками (один многострочный INSERT на пачку) по размеру
+# или по таймеру. Если база не успевает, put() ждет место в очереди
+
+def dto_to_row(dto):
+    return {
+        "name": dto["title"],
+        "description": dto["description"],
+        "participant_conditions": dto["participant_conditions"],
+        "location": dto["location"],
+        "dates": dto["dates"],
+        "organizer_id": dto["organizer_id"],
+        "source_url": dto.get("source_url"),
+        "content_hash": dto.get("content_hash"),
+        "http_etag": dto.get("http_etag"),
+        "http_last_modified": dto.get("http_last_modified"),
+        "feed_hash": dto.get("feed_hash"),
+    }
+
+UPSERT_COLUMNS = [
+    "name", "description", "participant_conditions", "location", "dates",
+    "content_hash", "http_etag", "http_last_modified",
+]
+
+class HackathonWriteError(Exception):
+    pass
+
+class HackathonWriter:
+    def __init__(self, batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL,
+                 queue_size=WRITER_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._task = None
+        # join()/close() просят записать накопленное сразу, не дожидаясь таймера
+        self._flush_now = asyncio.Event()
+        self._joiners = 0
+        self._reported_failed = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, dto):
+        self.start()
+        await self._queue.put(dto)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # ждет записи всего, что уже в очереди; если с прошлого join() какие-то
+    # пачки не записались, поднимает HackathonWriteError
+    async def join(self):
+        self._joiners += 1
+        self._flush_now.set()
+        try:
+            await self._queue.join()
+        finally:
+            self._joiners -= 1
+            if not self._joiners:
+                self._flush_now.clear()
+        failed = self.failed - self._reported_failed
+        self._reported_failed = self.failed
+        if failed:
+            raise HackathonWriteError(f"{failed} hackathons were not written")
+
+    async def close(self):
+        if self._task is None:
+            return
+        # close() зовут при остановке процесса: ошибка записи логируется
+        # (строки уже посчитаны в failed), чтобы вызывающий успел закрыть
+        # http-сессию, engine и пул парсинга
+        try:
+            await self.join()
+        except HackathonWriteError:
+            logger.exception("Hackathon writer closed with unwritten rows")
+        finally:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _get(self, timeout):
+        getter = asyncio.ensure_future(self._queue.get())
+        flush = asyncio.ensure_future(self._flush_now.wait())
+        done, _ = await asyncio.wait({getter, flush}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        flush.cancel()
+        if getter in done:
+            return getter.result()
+        # отмененный get() оставляет элемент в очереди, он не теряется
+        getter.cancel()
+        try:
+            return await getter
+        except asyncio.CancelledError:
+            return None
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            # очередь пуста и кто-то ждет join() - пишем сразу
+            if self._flush_now.is_set():
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            dto = await self._get(timeout)
+            if dto is None:
+                break
+            batch.append(dto)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+                self.written += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Failed to write %d hackathons", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch):
+        rows = [dto_to_row(dto) for dto in batch]
+        # в одном INSERT ... ON CONFLICT url может встречаться только раз
+        by_url = {row["source_url"]: row for row in rows if row["source_url"]}
+        rows = [row for row in rows if not row["source_url"]] + list(by_url.values())
+        statement = insert(Hackathon)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Hackathon.source_url],
+            set_={
+                **{column: statement.excluded[column] for column in UPSERT_COLUMNS},
+                # хеш ленты приходит только из ingest_feed, обычный обход его не трогает
+                "feed_hash": func.coalesce(statement.excluded.feed_hash, Hackathon.feed_hash),
+                "version": Hackathon.version + 1,
+            }
+        )
+        async with get_async_session() as session:
+            await session.execute(statement, rows)
+            await session.commit()
+
+# один писатель на event loop, по аналогии с общей http-сессией
+_writer = None
+_writer_loop = None
+
+def get_hackathon_writer():
+    global _writer, _writer_loop
+    loop = asyncio.get_running_loop()
+    if _writer is None or _writer_loop is not loop:
+        _writer = HackathonWriter()
+        _writer_loop = loop
+    return _writer
+
+async def close_hackathon_writer():
+    global _writer, _writer_loop
+    if _writer is not None and _writer_loop is asyncio.get_running_loop():
+        await _writer.close()
+    _writer = None
+    _writer_loop = None
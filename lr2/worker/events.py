@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+
+load_dotenv("app/.env")
+
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", 15))
+
+logger = logging.getLogger(__name__)
+
+# воркер публикует смену состояния задачи (и пачки, в которую она входит)
+# в канал redis job-events:<id>, а parser-app раздает их подписчикам через SSE,
+# вместо того чтобы клиенты опрашивали /task/<id>
+
+def channel(job_id):
+    return f"job-events:{job_id}"
+
+_client = None
+
+def publish_event(job_id, event):
+    global _client
+    try:
+        if _client is None:
+            _client = redis.Redis.from_url(redis_url)
+        _client.publish(channel(job_id), json.dumps({"id": job_id, **event}, default=str))
+    except redis.RedisError:
+        logger.exception("Failed to publish event for %s", job_id)
+
+# подписка открывается до того, как читается текущее состояние задач,
+# поэтому смена состояния между ними не теряется
+class JobEvents:
+    def __init__(self, job_ids):
+        self.job_ids = job_ids
+        self._client = None
+        self._pubsub = None
+
+    async def __aenter__(self):
+        self._client = aioredis.Redis.from_url(redis_url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(*(channel(job_id) for job_id in self.job_ids))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._pubsub.unsubscribe()
+        await self._pubsub.aclose()
+        await self._client.aclose()
+
+    # None - если за EVENTS_HEARTBEAT событий не было
+    async def next(self):
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_HEARTBEAT)
+        return json.loads(message["data"]) if message else None
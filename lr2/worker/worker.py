@@ -1,18 +1,341 @@
-from celery import Celery
+from celery import Celery, group
+from celery.result import GroupResult
+from celery.states import FAILURE, PENDING, SUCCESS, READY_STATES
+from celery.utils import uuid
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_init, worker_process_shutdown, task_prerun, task_postrun
 from dotenv import load_dotenv
-from task2.parser import async_fetch_parse_load
+from task2.parser import async_fetch_parse_load, _async_fetch_data, _parse_html, get_http_session, close_http_session
+from task2.writer import get_hackathon_writer, close_hackathon_writer, HackathonWriteError, WRITER_BATCH_SIZE
+from task2.limiter import get_fetch_limiter_stats
+from task2.db import get_async_engine, dispose_async_engine
+from worker.events import publish_event
 import asyncio
+import json
+import logging
 import os
+import time
 
 load_dotenv("app/.env")
 
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 celery_app = Celery("worker", backend=redis_url, broker=redis_url)
 
-@celery_app.task
+STATS_LOG_EVERY = int(os.getenv("WORKER_STATS_LOG_EVERY", 100))
+BATCH_PROGRESS_INTERVAL = float(os.getenv("BATCH_PROGRESS_INTERVAL", 1.0))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", 5.0))
+
+# отдельные очереди, чтобы большой /parse_celery не задерживал одиночные
+# /parse_url: interactive - один url, bulk - пачки url, db - запись пачек в базу.
+# Лимиты времени и acks_late задаются на задачу, а prefetch и autoscale -
+# флагами воркера каждой очереди (см. docker-compose.yml, те же переменные)
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+DB_QUEUE = "db"
+
+logger = logging.getLogger(__name__)
+
+def queue_options(queue, soft_time_limit, time_limit):
+    prefix = f"CELERY_{queue.upper()}_"
+    return {
+        "acks_late": os.getenv(prefix + "ACKS_LATE", "true").lower() == "true",
+        "soft_time_limit": int(os.getenv(prefix + "SOFT_TIME_LIMIT", soft_time_limit)),
+        "time_limit": int(os.getenv(prefix + "TIME_LIMIT", time_limit)),
+    }
+
+# каждый prefork-процесс держит один event loop на все время жизни, а вместе
+# с ним одну aiohttp-сессию, один пул соединений к базе и одного писателя.
+# Раньше asyncio.run() на каждую задачу создавал и закрывал все это заново
+_loop = None
+
+class WorkerStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tasks = 0
+        self.busy = 0.0
+
+    def record(self, elapsed):
+        self.tasks += 1
+        self.busy += elapsed
+
+    def log(self):
+        wall = time.perf_counter() - self.started
+        logger.info(
+            "pid %d: %d tasks, %.2f tasks/sec wall, %.2f tasks/sec busy",
+            os.getpid(), self.tasks,
+            self.tasks / wall if wall else 0.0,
+            self.tasks / self.busy if self.busy else 0.0
+        )
+        logger.info("pid %d: fetch %s", os.getpid(), get_fetch_limiter_stats())
+
+_stats = WorkerStats()
+
+async def _open_resources():
+    await get_http_session()
+    get_async_engine()
+
+async def _close_resources():
+    await close_hackathon_writer()
+    await close_http_session()
+    await dispose_async_engine()
+
+def _get_loop():
+    # solo/threads пулы не шлют worker_process_init, поэтому loop создается лениво
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+        _loop.run_until_complete(_open_resources())
+    return _loop
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    global _stats
+    _stats = WorkerStats()
+    _get_loop()
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    _stats.log()
+    _loop.run_until_complete(_close_resources())
+    _loop.close()
+    _loop = None
+
+def _run(coro):
+    start = time.perf_counter()
+    loop = _get_loop()
+    future = asyncio.ensure_future(coro, loop=loop)
+    try:
+        return loop.run_until_complete(future)
+    except SoftTimeLimitExceeded:
+        # исключение прилетает сигналом посреди loop; задачу надо отменить,
+        # иначе она продолжит выполняться внутри следующей
+        future.cancel()
+        loop.run_until_complete(asyncio.gather(future, return_exceptions=True))
+        raise
+    finally:
+        _stats.record(time.perf_counter() - start)
+        if _stats.tasks % STATS_LOG_EVERY == 0:
+            _stats.log()
+
+async def _parse_url(url: str):
+    writer = get_hackathon_writer()
+    result = await async_fetch_parse_load(url, writer)
+    # задача считается выполненной только после записи в базу: join() пишет
+    # накопленное сразу, без ожидания flush_interval, и падает, если запись
+    # не удалась, - тогда задача завершается с ошибкой
+    await writer.join()
+    return result
+
+@celery_app.task(**queue_options(INTERACTIVE_QUEUE, soft_time_limit=30, time_limit=60))
 def parse_url(url: str):
-    return asyncio.run(async_fetch_parse_load(url))
+    return _run(_parse_url(url))
+
+# пачка url обходится одной задачей: страницы качаются конкурентно внутри
+# воркера, а в бэкенд результатов пишется прогресс и итог по каждому url.
+# writing - url, чьи записи ушли в очередь db, но еще не записаны
+def _chunk_progress(outcomes, total):
+    counts = {"done": 0, "failed": 0, "writing": 0}
+    for outcome in outcomes:
+        counts[outcome["status"]] += 1
+    return {**counts, "pending": total - len(outcomes)}
+
+# bulk-воркер только качает и парсит, а готовые dto пачками уходят
+# задачей write_hackathons в очередь db. Задача пачки завершается раньше
+# записи, поэтому id задач записи сохраняются в ее результате, и url
+# считается готовым, только когда его задача записи выполнилась
+class QueuedWriter:
+    def __init__(self, job_id=None, batch_size=WRITER_BATCH_SIZE):
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.urls = set()
+        self.writes = []
+        self._batch = []
+
+    async def put(self, dto):
+        self._batch.append(dto)
+        self.urls.add(dto["source_url"])
+        if len(self._batch) >= self.batch_size:
+            self._send()
+
+    async def join(self):
+        self._send()
+
+    def _send(self):
+        if self._batch:
+            result = write_hackathons.delay(self._batch, job_id=self.job_id)
+            self.writes.append({"id": result.id, "urls": [dto["source_url"] for dto in self._batch]})
+            self._batch = []
+
+# load=False - только скачать и разобрать, без базы: так crawl_bench
+# гоняет eager-режим celery офлайн, как и остальные режимы с --load none
+async def _fetch_parse(url, writer=None):
+    data, status, _ = await _async_fetch_data(url)
+    _parse_html(data)
+    return True
+
+class _NoWriter:
+    async def join(self):
+        pass
+
+async def _parse_chunk(task, urls, load=True):
+    crawl_page = async_fetch_parse_load if load else _fetch_parse
+    # в eager-режиме вложенная задача запустилась бы на уже работающем loop
+    if not load:
+        writer = _NoWriter()
+    elif task.request.is_eager:
+        writer = get_hackathon_writer()
+    else:
+        writer = QueuedWriter(task.request.group)
+    outcomes = []
+    last_report = time.monotonic()
+
+    async def crawl(url):
+        nonlocal last_report
+        try:
+            if await crawl_page(url, writer):
+                status = "writing" if url in getattr(writer, "urls", ()) else "done"
+                outcomes.append({"url": url, "status": status, "error": None})
+            else:
+                outcomes.append({"url": url, "status": "failed", "error": "Page was not found"})
+        except Exception as e:
+            outcomes.append({"url": url, "status": "failed", "error": repr(e)})
+        if time.monotonic() - last_report >= BATCH_PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            progress = _chunk_progress(outcomes, len(urls))
+            task.update_state(state="PROGRESS", meta=progress)
+            _publish_task_event(task, "PROGRESS", progress)
+
+    await asyncio.gather(*(crawl(url) for url in urls))
+    await writer.join()
+    return {**_chunk_progress(outcomes, len(urls)), "results": outcomes,
+            "writes": getattr(writer, "writes", [])}
+
+@celery_app.task(bind=True, **queue_options(BULK_QUEUE, soft_time_limit=600, time_limit=900))
+def parse_urls(self, urls: list[str], load: bool = True):
+    return _run(_parse_chunk(self, urls, load))
+
+async def _write_hackathons(dtos):
+    writer = get_hackathon_writer()
+    for dto in dtos:
+        await writer.put(dto)
+    await writer.join()
+    return len(dtos)
+
+# join() падает, если пачка не записалась; upsert по source_url повторять
+# безопасно, поэтому задача перезапускается, а после всех попыток - FAILURE
+@celery_app.task(autoretry_for=(HackathonWriteError,), retry_backoff=True, max_retries=3,
+                 **queue_options(DB_QUEUE, soft_time_limit=60, time_limit=120))
+def write_hackathons(dtos: list[dict], job_id=None):
+    return _run(_write_hackathons(dtos))
+
+# QUEUED вместо PENDING: /events отличает поставленную задачу от неизвестного id
+def enqueue_url(url):
+    task_id = uuid()
+    celery_app.backend.store_result(task_id, None, "QUEUED")
+    return parse_url.apply_async(args=[url], task_id=task_id)
+
+# размеры пачек хранятся рядом с группой: после FAILURE в мете пачки
+# остается только исключение, и ее url иначе выпали бы из счетчиков
+def _chunk_sizes_key(job_id):
+    return f"job-chunk-sizes:{job_id}"
+
+def enqueue_batch(urls, chunk_size):
+    signatures = []
+    sizes = []
+    for i in range(0, len(urls), chunk_size):
+        chunk = urls[i:i + chunk_size]
+        task_id = uuid()
+        # размер пачки известен до старта задачи, чтобы pending считался сразу
+        celery_app.backend.store_result(task_id, _chunk_progress([], len(chunk)), "QUEUED")
+        signatures.append(parse_urls.s(chunk).set(task_id=task_id))
+        sizes.append(len(chunk))
+    job = group(signatures).apply_async()
+    job.save()
+    celery_app.backend.set(_chunk_sizes_key(job.id), json.dumps(sizes))
+    return job
+
+# меты задач одним MGET вместо запроса на каждую
+def _task_metas(task_ids):
+    backend = celery_app.backend
+    if not task_ids:
+        return []
+    if not hasattr(backend, "mget"):
+        return [backend.get_task_meta(task_id) for task_id in task_ids]
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    return [backend.decode_result(value) if value else {"status": PENDING, "result": None} for value in values]
+
+def get_batch_status(job_id):
+    job = GroupResult.restore(job_id, app=celery_app)
+    if job is None:
+        return None
+    sizes = json.loads(celery_app.backend.get(_chunk_sizes_key(job_id)) or "[]")
+    status = {"done": 0, "failed": 0, "writing": 0, "pending": 0, "failed_chunks": 0}
+    finished = True
+    writes = []
+    for i, meta in enumerate(_task_metas([result.id for result in job.results])):
+        finished = finished and meta["status"] in READY_STATES
+        if meta["status"] == FAILURE:
+            status["failed_chunks"] += 1
+            status["failed"] += sizes[i] if i < len(sizes) else 0
+            continue
+        info = meta["result"] if isinstance(meta["result"], dict) else {}
+        for key in ("done", "failed", "writing", "pending"):
+            status[key] += info.get(key, 0)
+        writes += info.get("writes", [])
+    for write, meta in zip(writes, _task_metas([write["id"] for write in writes])):
+        write_status = meta["status"]
+        if write_status == SUCCESS:
+            moved = "done"
+        elif write_status == FAILURE:
+            moved = "failed"
+        else:
+            finished = False
+            continue
+        status["writing"] -= len(write["urls"])
+        status[moved] += len(write["urls"])
+    status["state"] = "SUCCESS" if finished else "PROGRESS"
+    return status
+
+# события о смене состояния для /events: сама задача и, если она часть
+# пачки, агрегированный статус всей пачки. Статус пачки читает мету всех
+# ее задач, поэтому на PROGRESS он пересчитывается не чаще раза
+# в JOB_PROGRESS_INTERVAL на процесс, а на смену состояния - всегда
+_job_published = {}
+
+def _publish_task_event(task, state, meta=None):
+    if task.request.is_eager:
+        return
+    publish_event(task.request.id, {"state": state, **(meta or {})})
+    # задачи записи не входят в группу, но меняют ее статус
+    job_id = task.request.group or (task.request.kwargs or {}).get("job_id")
+    if not job_id:
+        return
+    now = time.monotonic()
+    if state == "PROGRESS" and now - _job_published.get(job_id, 0.0) < JOB_PROGRESS_INTERVAL:
+        return
+    if len(_job_published) > 1000:
+        _job_published.clear()
+    _job_published[job_id] = now
+    publish_event(job_id, get_batch_status(job_id) or {})
+
+@task_prerun.connect
+def publish_task_started(task_id=None, task=None, **kwargs):
+    _publish_task_event(task, "STARTED")
+
+@task_postrun.connect
+def publish_task_finished(task_id=None, task=None, state=None, retval=None, **kwargs):
+    meta = {key: retval[key] for key in ("done", "failed", "writing", "pending")} if isinstance(retval, dict) else {}
+    _publish_task_event(task, state, meta)
 
 celery_app.conf.task_routes = {
-    "worker.parse_url": {"queue": "default"},
-}
\ No newline at end of file
+    parse_url.name: {"queue": INTERACTIVE_QUEUE},
+    parse_urls.name: {"queue": BULK_QUEUE},
+    write_hackathons.name: {"queue": DB_QUEUE},
+}
+celery_app.conf.task_default_queue = INTERACTIVE_QUEUE
+# с acks_late задача упавшего воркера возвращается в очередь
+celery_app.conf.task_reject_on_worker_lost = True